@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FUGA.settings')
 
 application = get_asgi_application()
+
+# Resume import jobs queued before the last restart.
+from webapp.jobs import resume_import_jobs  # noqa: E402
+
+resume_import_jobs()
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'webapp.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,6 +82,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Background import jobs hold the write lock while they run.
+            'timeout': 30,
+        },
     }
 }
 
@@ -125,6 +130,36 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'webapp', 'static'),
 ]
 
+# Uploaded files (import job uploads)
+
+MEDIA_URL = '/media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Cache
+# Shared by every worker process on the host, so import progress and cache
+# invalidations are seen by all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Export bodies, each at most EXPORT_CACHE_MAX_BYTES, so at most 800 MiB
+    # on disk and none of it held in worker memory.
+    'exports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'exports',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100,
+        },
+    },
+}
+
 
 
 # Default primary key field type
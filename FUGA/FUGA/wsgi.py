@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FUGA.settings')
 
 application = get_wsgi_application()
+
+# Resume import jobs queued before the last restart.
+from webapp.jobs import resume_import_jobs  # noqa: E402
+
+resume_import_jobs()
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Device, Variable, Alarm, Trend
+from .devices import delete_devices
+from .models import Device, Variable, Alarm, Trend, ImportJob
+from .search import MIN_TERM_LENGTH, matching_ids, search_index_available
 
 
 class VariableInline(admin.TabularInline):
@@ -20,6 +22,21 @@ class TrendInline(admin.TabularInline):
     fields = ['tag_description', 'trend_types', 'tag_name', 'item_name', 'time']
 
 
+class TagSearchMixin:
+    """Answer admin searches from the tag search index instead of LIKE scans.
+
+    Falls back to ``search_fields`` for terms too short for the index, or
+    when the database has none.
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = search_term.split()
+        if not search_index_available() or not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=matching_ids(self.search_kind, search_term)), False
+
+
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
     list_display = ['device_name', 'device_type', 'protocol', 'modbus_variant', 'created_at']
@@ -52,9 +69,17 @@ class DeviceAdmin(admin.ModelAdmin):
 
     inlines = [VariableInline, AlarmInline, TrendInline]
 
+    # Django's collector would load every variable, alarm and trend first.
+    def delete_model(self, request, obj):
+        delete_devices(Device.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_devices(queryset)
+
 
 @admin.register(Variable)
-class VariableAdmin(admin.ModelAdmin):
+class VariableAdmin(TagSearchMixin, admin.ModelAdmin):
+    search_kind = 'variable'
     list_display = ['item_name', 'device', 'io_device', 'data_type', 'address']
     list_filter = ['data_type', 'device__device_type', 'created_at']
     search_fields = ['item_name', 'tag_name', 'equipment']
@@ -62,7 +87,8 @@ class VariableAdmin(admin.ModelAdmin):
 
 
 @admin.register(Alarm)
-class AlarmAdmin(admin.ModelAdmin):
+class AlarmAdmin(TagSearchMixin, admin.ModelAdmin):
+    search_kind = 'alarm'
     list_display = ['alarm_name', 'device', 'alarm_type', 'category']
     list_filter = ['alarm_type', 'category', 'device__device_type', 'created_at']
     search_fields = ['alarm_name', 'alarm_tag', 'equipment']
@@ -70,8 +96,16 @@ class AlarmAdmin(admin.ModelAdmin):
 
 
 @admin.register(Trend)
-class TrendAdmin(admin.ModelAdmin):
+class TrendAdmin(TagSearchMixin, admin.ModelAdmin):
+    search_kind = 'trend'
     list_display = ['tag_description', 'device', 'trend_types', 'time']
     list_filter = ['trend_types', 'device__device_type', 'created_at']
     search_fields = ['tag_description', 'tag_name', 'item_name']
     raw_id_fields = ['device']
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'rows_processed', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
@@ -0,0 +1,433 @@
+import base64
+import gzip
+import json
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exporters import DEVICE_ORDER, GZIP_LEVEL, export_filters
+from .importers import BATCH_SIZE, LOOKUP_CHUNK_SIZE, batched, bulk_update_rows, bulk_upsert
+from .models import Alarm, DataVersion, Device, ExportFragment, Trend, Variable
+
+
+DEVICE_PAGE_SIZE = 100
+MAX_DEVICE_PAGE_SIZE = 1000
+
+# Fields listed when the request does not pick them with ``fields=``.
+DEVICE_LIST_FIELDS = ['id', 'device_name', 'device_type', 'protocol', 'created_at']
+DEVICE_FIELDS = [field.name for field in Device._meta.concrete_fields]
+
+# get_device bodies are cached per device and ``updated_at``, which writes
+# to the device or its children move on, so stale entries only age out.
+DEVICE_CACHE_KEY = 'device:{}:{}'
+DEVICE_CACHE_TIMEOUT = 24 * 60 * 60
+
+DEVICE_DOCUMENT_FIELDS = [
+    'id', 'device_name', 'device_type', 'tag_prefix', 'io_device', 'protocol', 'modbus_variant',
+    'device_ip', 'modbus_port', 'port_name', 'unit_number', 'memory',
+    'gateway_address', 'slave_id', 'port_name_rtu', 'memory_rtu', 'serial_port', 'baud_rate', 'data_bits',
+    'parity', 'stop_bits',
+    'iec_device_ip', 'iec_port', 'ied_name', 'access_point', 'logical_device', 'report_control'
+]
+
+# A bulk save of thousands of devices with their children outgrows Django's
+# DATA_UPLOAD_MAX_MEMORY_SIZE, so that endpoint reads its body up to this.
+BULK_SAVE_MAX_BYTES = 64 * 1024 * 1024
+
+REQUIRED_DEVICE_FIELDS = ['device_name', 'device_type', 'tag_prefix', 'io_device', 'protocol']
+
+# Device fields a save_device document can set.
+DEVICE_SAVE_FIELDS = [
+    'device_name', 'device_type', 'tag_prefix', 'io_device', 'protocol', 'modbus_variant',
+    'device_ip', 'modbus_port', 'port_name', 'unit_number', 'memory',
+    'gateway_address', 'slave_id', 'port_name_rtu', 'memory_rtu', 'serial_port', 'baud_rate', 'data_bits',
+    'parity', 'stop_bits',
+    'iec_device_ip', 'iec_port', 'ied_name', 'access_point', 'logical_device', 'report_control'
+]
+
+# save_device child list -> (model, natural key, {field: default when not posted}).
+DEVICE_CHILDREN = {
+    'variables': (Variable, 'item_name', {
+        'io_device': '', 'tag_name': '', 'address': '', 'equipment': '', 'data_type': 'float'
+    }),
+    'alarms': (Alarm, 'alarm_name', {
+        'alarm_type': 'analog', 'category': 'low', 'alarm_tag': '', 'equipment': '', 'item_name': ''
+    }),
+    'trends': (Trend, 'tag_description', {
+        'trend_types': 'periodic', 'tag_name': '', 'item_name': '', 'time': '00:00'
+    }),
+}
+
+# Document key -> (child model, fields), children listed in model order.
+DEVICE_DOCUMENT_CHILDREN = {
+    'variables': (Variable, ['id', 'item_name', 'io_device', 'tag_name', 'address', 'equipment', 'data_type']),
+    'alarms': (Alarm, ['id', 'alarm_name', 'alarm_type', 'category', 'alarm_tag', 'equipment', 'item_name']),
+    'trends': (Trend, ['id', 'tag_description', 'trend_types', 'tag_name', 'item_name', 'time']),
+}
+
+
+def encode_cursor(created_at, device_id):
+    value = f'{created_at.isoformat()}|{device_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(value).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, id)`` of the last device a page ended on."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, device_id = value.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        device_id = int(device_id)
+    except ValueError:
+        created_at = None
+
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, device_id
+
+
+def list_fields(params):
+    fields = [field.strip() for field in params.get('fields', '').split(',') if field.strip()]
+    invalid = [field for field in fields if field not in DEVICE_FIELDS]
+    if invalid:
+        raise ValueError(f'Invalid fields: {invalid[0]}')
+
+    # The id always comes first, so a page can be followed up by device.
+    return list(dict.fromkeys(['id', *fields])) if fields else DEVICE_LIST_FIELDS
+
+
+def filtered_devices(params):
+    """Return the devices matching the export filters and ``name`` prefix in ``params``."""
+    devices = Device.objects.filter(**export_filters(params))
+    if params.get('name'):
+        devices = devices.filter(device_name__startswith=params['name'])
+    return devices
+
+
+def json_params(data):
+    """Turn a JSON object of filters, e.g. ``{"ids": [1, 2]}``, into query parameters."""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object of filters')
+
+    params = QueryDict(mutable=True)
+    for key, value in data.items():
+        params.setlist(key, [str(item) for item in value] if isinstance(value, list) else [str(value)])
+    return params
+
+
+def device_page(params):
+    """Return the page of the device list that query ``params`` ask for.
+
+    Pages are keyed on the ``(created_at, id)`` of their last device rather
+    than an offset, so every page costs the same however deep it is. Takes
+    the export filters plus a ``name`` prefix; raises ValueError naming the
+    first invalid parameter.
+    """
+    fields = list_fields(params)
+    try:
+        page_size = max(1, min(int(params.get('page_size', DEVICE_PAGE_SIZE)), MAX_DEVICE_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid page_size')
+
+    devices = filtered_devices(params)
+    if params.get('cursor'):
+        created_at, device_id = decode_cursor(params['cursor'])
+        devices = devices.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=device_id))
+
+    rows = list(devices.order_by(*DEVICE_ORDER).values(*dict.fromkeys([*fields, 'created_at']))[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+    return {
+        'devices': [
+            {
+                field: row[field].isoformat() if isinstance(row[field], datetime) else row[field]
+                for field in fields
+            } for row in rows
+        ],
+        'next_cursor': next_cursor
+    }
+
+
+def device_etag(device_id, updated_at):
+    return f'"device-{device_id}-{updated_at.timestamp()}"'
+
+
+def device_documents(device_ids):
+    """Yield the get_device document of each of ``device_ids``, in order, as a dict.
+
+    Each batch of devices takes one query per table, however many children
+    the devices have. Devices deleted meanwhile are left out.
+    """
+    for batch in batched(device_ids, LOOKUP_CHUNK_SIZE):
+        documents = {
+            device['id']: device
+            for device in Device.objects.filter(id__in=batch).values(*DEVICE_DOCUMENT_FIELDS)
+        }
+        for key, (model, fields) in DEVICE_DOCUMENT_CHILDREN.items():
+            for device in documents.values():
+                device[key] = []
+            children = model.objects.filter(device_id__in=batch).order_by('device_id', *model._meta.ordering)
+            for child in children.values('device_id', *fields):
+                child['id'] = str(child['id'])
+                documents[child.pop('device_id')][key].append(child)
+
+        for device_id in batch:
+            if device_id in documents:
+                yield documents[device_id]
+
+
+def render_device_document(device_id):
+    """Return the get_device JSON body for ``device_id`` as bytes."""
+    device = next(device_documents([device_id]), None)
+    if device is None:
+        raise Device.DoesNotExist('Device matching query does not exist.')
+
+    return json.dumps({'success': True, 'device': device}, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def device_document(device_id, updated_at, accepts_gzip=False):
+    """Return ``(encoding, body)`` of the get_device document at ``updated_at``.
+
+    The body is cached gzipped, and sent that way when the client
+    ``accepts_gzip``.
+    """
+    key = DEVICE_CACHE_KEY.format(device_id, updated_at.isoformat())
+    body = cache.get(key)
+    if body is None:
+        document = render_device_document(device_id)
+        body = gzip.compress(document, GZIP_LEVEL, mtime=0)
+        cache.set(key, body, DEVICE_CACHE_TIMEOUT)
+        if not accepts_gzip:
+            return None, document
+
+    if accepts_gzip:
+        return 'gzip', body
+    return None, gzip.decompress(body)
+
+
+def device_batch_chunks(devices):
+    """Stream the get_device documents of ``devices`` as one JSON response body."""
+    device_ids = list(devices.order_by(*DEVICE_ORDER).values_list('id', flat=True))
+    yield '{"success": true, "devices": ['
+    separator = ''
+    for batch in batched(device_documents(device_ids), LOOKUP_CHUNK_SIZE):
+        yield separator + ', '.join(json.dumps(device, cls=DjangoJSONEncoder) for device in batch)
+        separator = ', '
+    yield ']}'
+
+
+def apply_device_fields(device, data):
+    """Set ``device``'s fields from a save_device document."""
+    device.device_name = data['device_name']
+    device.device_type = data['device_type']
+    device.tag_prefix = data['tag_prefix']
+    device.io_device = data['io_device']
+    device.protocol = data['protocol']
+    device.modbus_variant = data.get('modbus_variant', 'tcp')
+
+    if data['protocol'] == 'modbus':
+        if data.get('modbus_variant') == 'tcp':
+            device.device_ip = data.get('device_ip')
+            device.modbus_port = data.get('modbus_port', 502)
+            device.port_name = data.get('port_name', '')
+            device.unit_number = data.get('unit_number', 1)
+            device.memory = data.get('memory', True)
+        else:
+            device.gateway_address = data.get('gateway_address')
+            device.slave_id = data.get('slave_id')
+            device.port_name_rtu = data.get('port_name_rtu', '')
+            device.memory_rtu = data.get('memory_rtu', True)
+            device.serial_port = data.get('serial_port', '')
+            device.baud_rate = data.get('baud_rate', 38400)
+            device.data_bits = data.get('data_bits', 8)
+            device.parity = data.get('parity', 'None')
+            device.stop_bits = data.get('stop_bits', 1)
+
+    elif data['protocol'] == 'iec':
+        device.iec_device_ip = data.get('iec_device_ip')
+        device.iec_port = data.get('iec_port', 102)
+        device.ied_name = data.get('ied_name', '')
+        device.access_point = data.get('access_point', '')
+        device.logical_device = data.get('logical_device', '')
+        device.report_control = data.get('report_control', '')
+
+
+def child_records(key, device_id, posted):
+    """Map ``(device_id, natural key)`` to field values for a posted child list.
+
+    Raises ValueError on a natural key posted twice.
+    """
+    model, key_field, defaults = DEVICE_CHILDREN[key]
+    records = {}
+    for data in posted:
+        name = data.get(key_field, '')
+        if (device_id, name) in records:
+            raise ValueError(f'Duplicate {key_field}: {name}')
+        records[(device_id, name)] = {field: data.get(field, default) for field, default in defaults.items()}
+    return records
+
+
+def raw_delete(queryset):
+    """Delete the rows of ``queryset`` in one DELETE, without loading them; return the count."""
+    # QuerySet._raw_delete is private, but it is the fast path delete()
+    # itself takes when nothing cascades and no receivers listen. Callers
+    # delete dependent tables first and do the delete signals' work once
+    # per batch: the search index follows through database triggers, and
+    # DataVersion and export fragments are theirs to bump.
+    return queryset._raw_delete(queryset.db)
+
+
+def sync_children(key, posted):
+    """Make the ``key`` children (e.g. 'variables') of devices match their posted lists.
+
+    ``posted`` maps device ids to child lists. Rows are matched on their
+    natural key, so only inserted, changed and removed rows are written,
+    and kept rows keep their ids. Returns a Counter of created, updated,
+    unchanged and deleted rows.
+    """
+    model, key_field, defaults = DEVICE_CHILDREN[key]
+    records = {}
+    for device_id, children in posted.items():
+        records.update(child_records(key, device_id, children))
+
+    counts = bulk_upsert(model, key_field, records, list(defaults))
+
+    stale = {}
+    for batch in batched(list(posted), LOOKUP_CHUNK_SIZE):
+        rows = model.objects.filter(device_id__in=batch).values_list('pk', 'device_id', key_field)
+        stale.update((pk, device_id) for pk, device_id, name in rows if (device_id, name) not in records)
+    if stale:
+        # Child rows have no dependents, so each chunk is one DELETE; the
+        # work the delete signals would do per row is done once below.
+        for batch in batched(list(stale), LOOKUP_CHUNK_SIZE):
+            raw_delete(model.objects.filter(pk__in=batch))
+        device_ids = set(stale.values())
+        DataVersion.bump()
+        ExportFragment.invalidate(model, device_ids)
+        Device.touch(device_ids)
+    counts['deleted'] = len(stale)
+    return counts
+
+
+def save_devices(documents, batch_size=BATCH_SIZE):
+    """Validate and save a list of save_device documents in one transaction.
+
+    Every document is validated before anything is written, and nothing is
+    written unless all are valid. Returns ``(saved, results)`` with one
+    result per document, in order.
+    """
+    if not isinstance(documents, list) or not all(isinstance(data, dict) for data in documents):
+        raise ValueError('Expected a JSON array of device objects')
+
+    update_ids = [int(data['id']) for data in documents if str(data.get('id', '')).isdigit()]
+    stored = {}
+    for batch in batched(update_ids, LOOKUP_CHUNK_SIZE):
+        stored.update(Device.objects.in_bulk(batch))
+
+    names = [data.get('device_name') for data in documents if data.get('device_name')]
+    taken = {}
+    for batch in batched(names, LOOKUP_CHUNK_SIZE):
+        taken.update(Device.objects.filter(device_name__in=batch).values_list('device_name', 'id'))
+
+    devices = []
+    results = []
+    seen_ids = set()
+    seen_names = set()
+    now = timezone.now()
+    for index, data in enumerate(documents):
+        errors = {field: f'{field} is required' for field in REQUIRED_DEVICE_FIELDS if not data.get(field)}
+        device_id = data.get('id')
+        if device_id in (None, '', 'new'):
+            device = Device()
+        else:
+            device = stored.get(int(device_id)) if str(device_id).isdigit() else None
+            if device is None:
+                errors['id'] = f'Device {device_id} does not exist'
+                device = Device()
+            elif device.pk in seen_ids:
+                errors['id'] = f'Device {device_id} is posted more than once'
+            seen_ids.add(device.pk)
+            device.updated_at = now
+
+        if not errors:
+            apply_device_fields(device, data)
+            try:
+                device.full_clean(validate_unique=False, validate_constraints=False)
+            except ValidationError as e:
+                errors.update((field, ' '.join(messages)) for field, messages in e.message_dict.items())
+
+            name = data['device_name']
+            if name in seen_names or taken.get(name, device.pk) != device.pk:
+                errors['device_name'] = f'Device with this device_name already exists: {name}'
+            seen_names.add(name)
+
+            for key in DEVICE_CHILDREN:
+                if key in data:
+                    try:
+                        child_records(key, device.pk, data[key])
+                    except (AttributeError, TypeError):
+                        errors[key] = f'Expected a list of {key} objects'
+                    except ValueError as e:
+                        errors[key] = str(e)
+
+        devices.append(device)
+        results.append({'index': index, 'device_name': data.get('device_name'), 'errors': errors})
+
+    if any(result['errors'] for result in results):
+        return False, results
+
+    to_create = [device for device in devices if device.pk is None]
+    to_update = [device for device in devices if device.pk is not None]
+    with transaction.atomic():
+        Device.objects.bulk_create(to_create, batch_size=batch_size)
+        bulk_update_rows(Device, to_update, DEVICE_SAVE_FIELDS + ['updated_at'])
+        DataVersion.bump(devices=bool(to_create))
+        ExportFragment.invalidate(Device, [device.pk for device in to_update])
+
+        for key in DEVICE_CHILDREN:
+            posted = {device.pk: data[key] for device, data in zip(devices, documents) if key in data}
+            if posted:
+                sync_children(key, posted)
+
+    return True, [
+        {
+            'index': index,
+            'device_id': device.pk,
+            'device_name': device.device_name,
+            'status': 'updated' if device.pk in seen_ids else 'created'
+        } for index, device in enumerate(devices)
+    ]
+
+
+def delete_devices(devices):
+    """Delete ``devices`` and the rows that reference them, a table at a time.
+
+    Each batch of devices takes one DELETE per referencing table instead of
+    Django's collector loading every child first, so memory stays flat
+    however many children there are. Delete signals are not sent. Returns
+    the number of rows deleted per related name, plus 'devices'.
+    """
+    relations = [(relation.get_accessor_name(), relation.related_model, relation.field.attname)
+                 for relation in Device._meta.related_objects]
+    counts = dict.fromkeys([name for name, model, column in relations] + ['devices'], 0)
+    device_ids = list(devices.values_list('id', flat=True))
+
+    with transaction.atomic():
+        for batch in batched(device_ids, LOOKUP_CHUNK_SIZE):
+            for name, model, column in relations:
+                counts[name] += raw_delete(model.objects.filter(**{f'{column}__in': batch}))
+            counts['devices'] += raw_delete(Device.objects.filter(id__in=batch))
+        if device_ids:
+            DataVersion.bump(devices=True)
+
+    return counts
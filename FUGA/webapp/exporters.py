@@ -0,0 +1,674 @@
+import csv
+import hashlib
+import io
+import zipfile
+import zlib
+from datetime import datetime, time
+from functools import partial
+from itertools import chain, groupby
+from operator import itemgetter
+
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .iec_xml import IEC_XML_FIELDS, render_documents
+from .importers import LOOKUP_CHUNK_SIZE, batched
+from .models import Alarm, Device, ExportFragment, Trend, Variable
+
+
+# Rows fetched per database round trip, and CSV rows per streamed chunk.
+EXPORT_CHUNK_SIZE = 2000
+
+# Devices are exported newest first; ties between devices created in the
+# same instant go by id.
+DEVICE_ORDER = ['-created_at', 'id']
+
+# Rendered exports are cached per data version, so stale entries are never
+# served and only need to age out. They go to their own bounded cache alias.
+# Bodies are kept gzipped, and ones larger than the cap once compressed are
+# streamed without being kept.
+EXPORT_CACHE = 'exports'
+EXPORT_CACHE_KEY = 'export:{}:{}{}'
+EXPORT_CACHE_TIMEOUT = 24 * 60 * 60
+EXPORT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Same level as Django's GZipMiddleware.
+GZIP_LEVEL = 6
+
+# Bytes a cached gzip body is inflated by at a time, in and out, for
+# clients that do not accept gzip.
+GUNZIP_CHUNK_SIZE = 64 * 1024
+
+# Content types whose bodies are compressed already and are sent as they are.
+COMPRESSED_CONTENT_TYPES = {'application/zip'}
+
+# Query parameter -> Device lookup for exporting a subset of the project.
+# List filters take comma separated or repeated values; ranges take ISO
+# dates or datetimes, dates meaning midnight.
+EXPORT_LIST_FILTERS = {
+    'ids': 'id__in',
+    'device_type': 'device_type__in',
+    'protocol': 'protocol__in',
+    'modbus_variant': 'modbus_variant__in',
+}
+EXPORT_RANGE_FILTERS = {
+    'created_after': 'created_at__gte',
+    'created_before': 'created_at__lt',
+    'updated_after': 'updated_at__gte',
+    'updated_before': 'updated_at__lt',
+}
+
+DATA_TYPE_MAPPING = {
+    'float': 'REAL',
+    'int': 'INT',
+    'bool': 'BOOL',
+    'string': 'STRING'
+}
+
+POWEROP_DIALECT = {'delimiter': ';', 'quoting': csv.QUOTE_MINIMAL}
+CITECT_DIALECT = {'delimiter': ',', 'quoting': csv.QUOTE_ALL}
+
+PRIORITY_MAPPING = {
+    'low': 'LOW',
+    'medium': 'MEDIUM',
+    'high': 'HIGH',
+    'event': 'INFO'
+}
+
+
+class ZipStream:
+    """Write-only file object that collects what ZipFile writes until drained.
+
+    It cannot seek, so ZipFile streams each member with a data descriptor
+    instead of going back to patch its header.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(members):
+    """Stream a deflated zip of ``(filename, chunks)`` members.
+
+    Each member is compressed and sent as its chunks are rendered, so only
+    the member being written is ever held in memory.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for filename, chunks in members:
+            with zip_file.open(filename, 'w') as member:
+                for chunk in chunks:
+                    member.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+            yield stream.drain()
+    yield stream.drain()
+
+
+class Echo:
+    """File-like object whose write() returns the written value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows, dialect=POWEROP_DIALECT, chunk_size=EXPORT_CHUNK_SIZE):
+    """Render ``rows`` as CSV text, ``chunk_size`` rows per chunk.
+
+    The header goes out on its own so the first byte does not wait on the
+    database.
+    """
+    writer = csv.writer(Echo(), **dialect)
+    yield writer.writerow(header)
+    for batch in batched(rows, chunk_size):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def parse_filter_time(param, value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'Invalid {param}: {value}')
+        parsed = datetime.combine(parsed, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_filters(params):
+    """Return the Device lookups requested by the export filters in ``params``.
+
+    Raises ValueError naming the first invalid parameter.
+    """
+    filters = {}
+    for param, lookup in EXPORT_LIST_FILTERS.items():
+        values = {value.strip() for value in ','.join(params.getlist(param)).split(',') if value.strip()}
+        if not values:
+            continue
+
+        if param == 'ids':
+            if not all(value.isdigit() for value in values):
+                raise ValueError(f'Invalid {param}: {params.get(param)}')
+            values = {int(value) for value in values}
+        else:
+            choices = {choice for choice, label in Device._meta.get_field(param).choices}
+            invalid = sorted(values - choices)
+            if invalid:
+                raise ValueError(f'Invalid {param}: {invalid[0]}')
+        filters[lookup] = sorted(values)
+
+    for param, lookup in EXPORT_RANGE_FILTERS.items():
+        if params.get(param):
+            filters[lookup] = parse_filter_time(param, params[param].strip())
+    return filters
+
+
+def filters_digest(filters):
+    """Return a short, stable digest of ``filters``, or '' when there are none."""
+    if not filters:
+        return ''
+    return hashlib.sha1(repr(sorted(filters.items())).encode('utf-8')).hexdigest()[:12]
+
+
+# Device columns each per-device row is rendered from.
+EQUIPMENT_COLUMNS = [
+    'device_name', 'device_type', 'tag_prefix', 'io_device', 'protocol', 'modbus_variant',
+    'device_ip', 'modbus_port', 'gateway_address', 'slave_id', 'iec_device_ip', 'iec_port'
+]
+UNITS_COLUMNS = [
+    'device_name', 'protocol', 'modbus_variant', 'port_name', 'device_ip', 'memory', 'unit_number',
+    'port_name_rtu', 'gateway_address', 'memory_rtu', 'slave_id', 'baud_rate', 'data_bits', 'parity',
+    'stop_bits', 'ied_name', 'iec_device_ip', 'iec_port'
+]
+IEC_EQUIP_COLUMNS = ['device_name', 'device_type', 'tag_prefix', 'io_device']
+IEC_PORTS_COLUMNS = ['access_point', 'iec_port', 'board_name']
+
+
+def equipment_row(device):
+
+    ip_address = ''
+    port = ''
+
+    if device.protocol == 'modbus':
+        if device.modbus_variant == 'tcp':
+            ip_address = device.device_ip or ''
+            port = str(device.modbus_port or 502)
+        else:
+            ip_address = device.gateway_address or ''
+            port = str(device.slave_id or 1)
+    elif device.protocol == 'iec':
+        ip_address = device.iec_device_ip or ''
+        port = str(device.iec_port or 102)
+
+    return [
+        device.device_name,
+        device.device_type,
+        f'{device.device_type} - {device.device_name}',
+        device.tag_prefix,
+        device.io_device,
+        device.protocol.upper(),
+        ip_address,
+        port
+    ]
+
+
+def units_row(device):
+    if device.protocol == 'modbus':
+        if device.modbus_variant == 'tcp':
+            return [
+                device.device_name,
+                'MODBUS_TCP',
+                device.port_name or f'PORT_{device.device_name}',
+                device.device_ip or '',
+                'MODBUS_TCP',
+                'TRUE' if device.memory else 'FALSE',
+                device.unit_number or 1,
+                '', '', '', ''
+            ]
+        else:
+            return [
+                device.device_name,
+                'MODBUS_RTU',
+                device.port_name_rtu or f'PORT_{device.device_name}',
+                device.gateway_address or '',
+                'MODBUS_RTU',
+                'TRUE' if device.memory_rtu else 'FALSE',
+                device.slave_id or 1,
+                device.baud_rate or 38400,
+                device.data_bits or 8,
+                device.parity or 'None',
+                device.stop_bits or 1
+            ]
+    elif device.protocol == 'iec':
+        return [
+            device.device_name,
+            'IEC61850',
+            device.ied_name or f'IED_{device.device_name}',
+            device.iec_device_ip or '',
+            'IEC61850',
+            'TRUE',
+            device.iec_port or 102,
+            '', '', '', ''
+        ]
+
+
+def iec_equip_row(device):
+    return [
+        device.device_name or '',
+        'c1',
+        device.device_type or 'IED',
+        device.tag_prefix or '',
+        device.io_device or ''
+    ]
+
+
+def iec_ports_row(device):
+    return [
+        'IOServer1',
+        device.access_point or '',
+        device.iec_port or '102',
+        device.board_name or ''
+    ]
+
+
+def device_source(render, columns):
+    """Fragment source rendering one piece per device with ``render(device)``.
+
+    Only ``columns`` are fetched; ``device`` is a named tuple of them.
+    """
+    def source(device_ids):
+        devices = Device.objects.filter(id__in=device_ids).values_list('id', *columns, named=True)
+        for device in devices.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            piece = render(device)
+            if piece is not None:
+                yield device.id, piece
+    return source
+
+
+def variables_source(device_ids):
+    variables = Variable.objects.filter(device_id__in=device_ids).order_by('device_id', 'item_name').values_list(
+        'device_id', 'equipment', 'item_name', 'tag_name', 'io_device', 'data_type', 'address',
+        'device__device_name', 'device__io_device'
+    )
+    for device_id, equipment, item_name, tag_name, io_device, data_type, address, device_name, device_io in (
+        variables.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    ):
+        yield device_id, [
+            equipment or device_name,
+            item_name,
+            tag_name,
+            io_device or device_io,
+            DATA_TYPE_MAPPING.get(data_type, 'REAL'),
+            address,
+            '',
+            f'{item_name} from {device_name}',
+            '',
+            ''
+        ]
+
+
+def alarms_source(device_ids):
+    alarms = Alarm.objects.filter(device_id__in=device_ids).order_by('device_id', 'alarm_name').values_list(
+        'device_id', 'equipment', 'item_name', 'alarm_tag', 'alarm_name', 'category', 'alarm_type',
+        'device__device_name'
+    )
+    for device_id, equipment, item_name, alarm_tag, alarm_name, category, alarm_type, device_name in (
+        alarms.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    ):
+        yield device_id, [
+            equipment or device_name,
+            item_name,
+            alarm_tag,
+            alarm_name,
+            category.upper(),
+            alarm_type.upper(),
+            PRIORITY_MAPPING.get(category, 'MEDIUM'),
+            'TRUE',
+            'TRUE'
+        ]
+
+
+def iec_xml_source(device_ids):
+    devices = list(Device.objects.filter(id__in=device_ids).values_list('id', *IEC_XML_FIELDS))
+    documents = render_documents(dict(zip(IEC_XML_FIELDS, values)) for device_id, *values in devices)
+    for (device_id, *values), document in zip(devices, documents):
+        yield device_id, document
+
+
+def trend_time_interval(time_interval):
+    time_interval = time_interval or '00:01'
+    if ':' in time_interval:
+
+        parts = time_interval.split(':')
+        if len(parts) == 2:
+            minutes = int(parts[0])
+            seconds = int(parts[1])
+            total_seconds = minutes * 60 + seconds
+            if total_seconds >= 60:
+                time_interval = f'{total_seconds // 60}MIN'
+            else:
+                time_interval = f'{total_seconds}SEC'
+        else:
+            time_interval = '1MIN'
+
+    return time_interval
+
+
+def trends_source(device_ids):
+    trends = Trend.objects.filter(device_id__in=device_ids).order_by('device_id', 'tag_description').values_list(
+        'device_id', 'tag_description', 'trend_types', 'tag_name', 'item_name', 'time'
+    )
+    # Trends share a handful of intervals, so each is converted once.
+    intervals = {}
+    for device_id, tag_description, trend_types, tag_name, item_name, time in trends.iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        if time not in intervals:
+            intervals[time] = trend_time_interval(time)
+        yield device_id, [
+            tag_description,
+            trend_types.upper(),
+            tag_name,
+            item_name,
+            intervals[time],
+            '30DAYS',
+            'TRUE'
+        ]
+
+
+# Fragment kind -> (source yielding ``(device_id, piece)``, CSV dialect of
+# the pieces, or None for documents stored as they are).
+FRAGMENTS = {
+    'equipment': (device_source(equipment_row, EQUIPMENT_COLUMNS), POWEROP_DIALECT),
+    'units': (device_source(units_row, UNITS_COLUMNS), POWEROP_DIALECT),
+    'variables': (variables_source, POWEROP_DIALECT),
+    'alarms': (alarms_source, POWEROP_DIALECT),
+    'trends': (trends_source, POWEROP_DIALECT),
+    'iec_equip': (device_source(iec_equip_row, IEC_EQUIP_COLUMNS), CITECT_DIALECT),
+    'iec_ports': (device_source(iec_ports_row, IEC_PORTS_COLUMNS), CITECT_DIALECT),
+    'iec_xml': (iec_xml_source, None),
+}
+
+
+def render_fragments(kind, device_ids):
+    """Render and store the ``kind`` fragment of each of ``device_ids``.
+
+    The stamps are read before the rows, so a write committed in between
+    leaves a fragment stamped older than its device, which is rendered
+    again next time rather than served.
+    """
+    source, dialect = FRAGMENTS[kind]
+    stamps = dict(Device.objects.filter(id__in=device_ids).values_list('id', 'updated_at'))
+    fragments = dict.fromkeys(device_ids, '')
+    if dialect is None:
+        fragments.update(source(device_ids))
+    else:
+        # Sources yield each device's rows together, written in one call.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, **dialect)
+        for device_id, pieces in groupby(source(device_ids), itemgetter(0)):
+            writer.writerows(map(itemgetter(1), pieces))
+            fragments[device_id] = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    # Devices deleted meanwhile are left out.
+    ExportFragment.objects.bulk_create([
+        ExportFragment(device_id=device_id, kind=kind, content=content, device_updated_at=stamps[device_id])
+        for device_id, content in fragments.items() if device_id in stamps
+    ], update_conflicts=True, unique_fields=['device', 'kind'], update_fields=['content', 'device_updated_at'])
+    return fragments
+
+
+def device_fragments(kind, device_ids):
+    """Yield ``(device_id, fragment)`` for ``device_ids`` in order.
+
+    Stored fragments are reused; only missing and stale ones are rendered.
+    """
+    for batch in batched(device_ids, LOOKUP_CHUNK_SIZE):
+        fragments = dict(
+            ExportFragment.objects.filter(
+                kind=kind, device_id__in=batch, device_updated_at=F('device__updated_at')
+            ).values_list('device_id', 'content')
+        )
+        missing = [device_id for device_id in batch if device_id not in fragments]
+        if missing:
+            fragments.update(render_fragments(kind, missing))
+
+        for device_id in batch:
+            yield device_id, fragments[device_id]
+
+
+def fragment_chunks(header, kind, devices, dialect=POWEROP_DIALECT):
+    """Stream a CSV export as its header followed by the devices' fragments."""
+    yield csv.writer(Echo(), **dialect).writerow(header)
+
+    device_ids = list(devices.order_by(*DEVICE_ORDER).values_list('id', flat=True))
+    for batch in batched(device_fragments(kind, device_ids), LOOKUP_CHUNK_SIZE):
+        yield ''.join(fragment for device_id, fragment in batch)
+
+
+# Export type -> (download filename, header, fragment kind).
+CSV_EXPORTS = {
+    'equipment': ('EQUIP.csv', [
+        'ITEM_NAME', 'EQUIP_TYPE', 'COMMENT', 'CUSTOM01', 'CUSTOM02',
+        'PROTOCOL', 'IP_ADDRESS', 'PORT'
+    ], 'equipment'),
+    'units': ('UNITS.csv', [
+        'UNIT_NAME', 'UNIT_TYPE', 'PORT_NAME', 'IP_ADDRESS', 'PROTOCOL',
+        'MEMORY', 'UNIT_NUMBER', 'BAUD_RATE', 'DATA_BITS', 'PARITY', 'STOP_BITS'
+    ], 'units'),
+    'variables': ('VARIABLES.csv', [
+        'EQUIPMENT', 'ITEM_NAME', 'TAG_NAME', 'IO_DEVICE', 'DATA_TYPE',
+        'ADDRESS', 'UNIT', 'DESCRIPTION', 'MIN_VALUE', 'MAX_VALUE'
+    ], 'variables'),
+    'alarms': ('ALARMS.csv', [
+        'EQUIPMENT', 'ITEM_NAME', 'ALARM_TAG', 'ALARM_NAME', 'CATEGORY',
+        'ALARM_TYPE', 'PRIORITY', 'ACKNOWLEDGE', 'LOG'
+    ], 'alarms'),
+    'trends': ('TRENDS.csv', [
+        'TAG_DESCRIPTION', 'TREND_TYPES', 'TAG_NAME', 'ITEM_NAME',
+        'TIME_INTERVAL', 'RETENTION', 'COMPRESSION'
+    ], 'trends'),
+}
+
+
+def csv_export_chunks(csv_type, filters):
+    filename, header, kind = CSV_EXPORTS[csv_type]
+    return filename, fragment_chunks(header, kind, Device.objects.filter(**filters))
+
+
+def export_csv(csv_type, filters):
+    """Return ``(content_type, filename, chunks)`` for a PowerOp CSV export."""
+    return ('text/csv; charset=utf-8', *csv_export_chunks(csv_type, filters))
+
+
+def iec_devices(filters):
+    return Device.objects.filter(protocol='iec', **filters).order_by(*DEVICE_ORDER)
+
+
+def iec_xml_members(devices):
+    names = dict(devices.values_list('id', 'device_name'))
+    for device_id, document in device_fragments('iec_xml', list(names)):
+        yield f'{names[device_id] or "IEC_Device"}.xml', [document]
+
+
+def export_iec_xml(filters):
+    """Return ``(content_type, filename, chunks)`` for the IEC XML download.
+
+    A single IEC device gets its XML file; several get a zip of them.
+    """
+    devices = iec_devices(filters)
+
+    if devices.count() == 1:
+        filename, chunks = next(iec_xml_members(devices))
+        return 'application/xml', filename, chunks
+
+    return 'application/zip', 'IEC_XML_Files.zip', zip_chunks(iec_xml_members(devices))
+
+
+def iec_units_rows(devices):
+    # Unit numbers follow the device's position, so these rows are rendered
+    # live rather than stored as fragments.
+    for index, device in enumerate(devices.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        memory_value = 'FALSE' if getattr(device, 'memory_iec', None) == 'false' else 'TRUE'
+        protocol_value = f"IEC{device.iec_port or '102'}"
+
+        yield [
+            'c1',
+            device.io_device or device.device_name,
+            str(100 + index),
+            device.iec_device_ip or '',
+            protocol_value,
+            device.access_point or '',
+            'Primary',
+            '1',
+            memory_value
+        ]
+
+
+IEC_EQUIP_HEADER = ['Name', 'Cluster Name', 'Type', 'Tag Prefix', 'I/O Device']
+IEC_UNITS_HEADER = [
+    'Server Name', 'Name', 'Number', 'Address', 'Protocol',
+    'Port Name', 'Startup Mode', 'Priority', 'Memory'
+]
+IEC_PORTS_HEADER = ['Server Name', 'Port Name', 'Port Number', 'Board Name']
+
+
+def export_iec_files(filters):
+    """Return ``(content_type, filename, chunks)`` for the IEC configuration zip."""
+    devices = iec_devices(filters)
+    members = [
+        ('IEC_EQUIP.csv', fragment_chunks(IEC_EQUIP_HEADER, 'iec_equip', devices, CITECT_DIALECT)),
+        ('IEC_UNITS.csv', csv_chunks(IEC_UNITS_HEADER, iec_units_rows(devices), CITECT_DIALECT)),
+        ('IEC_PORTS.csv', fragment_chunks(IEC_PORTS_HEADER, 'iec_ports', devices, CITECT_DIALECT)),
+    ]
+    return 'application/zip', 'IEC_Configuration_Files.zip', zip_chunks(chain(members, iec_xml_members(devices)))
+
+
+def export_modbus_bundle(filters):
+    """Return ``(content_type, filename, chunks)`` for a zip of every PowerOp CSV."""
+    members = (csv_export_chunks(csv_type, filters) for csv_type in CSV_EXPORTS)
+    return 'application/zip', 'Modbus_Configuration_Files.zip', zip_chunks(members)
+
+
+# Export type -> function rendering ``(content_type, filename, chunks)`` for
+# the devices matching the given filters.
+EXPORTS = {
+    **{csv_type: partial(export_csv, csv_type) for csv_type in CSV_EXPORTS},
+    'iec_xml': export_iec_xml,
+    'iec_files': export_iec_files,
+    'modbus_bundle': export_modbus_bundle,
+}
+
+
+def export_etag(export_type, version, filters=None):
+    digest = filters_digest(filters)
+    return f'"{export_type}-{version}-{digest}"' if digest else f'"{export_type}-{version}"'
+
+
+def gzip_compressor():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of byte chunks as it goes."""
+    compressor = gzip_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gunzip_chunks(body, chunk_size=GUNZIP_CHUNK_SIZE):
+    """Yield the gzipped ``body`` inflated, ``chunk_size`` bytes at most at a time."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for start in range(0, len(body), chunk_size):
+        data = body[start:start + chunk_size]
+        while data:
+            chunk = decompressor.decompress(data, chunk_size)
+            if chunk:
+                yield chunk
+            data = decompressor.unconsumed_tail
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+def encoded_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def cached_export(export_type, version, filters=None, accepts_gzip=False):
+    """Return ``(content_type, filename, encoding, content)`` for ``export_type`` at ``version``.
+
+    ``content`` is the cached body as bytes, or an iterator: on a miss one
+    that renders the body and caches it once fully sent, and for a client
+    that cannot take the cached gzip body one that inflates it. It is gzipped, with
+    ``encoding`` 'gzip', when the client ``accepts_gzip`` and the content
+    type is not compressed already. Each set of ``filters`` is cached
+    separately.
+    """
+    filters = filters or {}
+    digest = filters_digest(filters)
+    key = EXPORT_CACHE_KEY.format(export_type, version, f':{digest}' if digest else '')
+    cached = caches[EXPORT_CACHE].get(key)
+    if cached is not None:
+        content_type, filename, encoding, body = cached
+        if encoding == 'gzip' and not accepts_gzip:
+            return content_type, filename, None, gunzip_chunks(body)
+        return cached
+
+    content_type, filename, chunks = EXPORTS[export_type](filters)
+    chunks = encoded_chunks(chunks)
+    if content_type in COMPRESSED_CONTENT_TYPES:
+        return content_type, filename, None, caching_chunks(key, (content_type, filename, None), chunks)
+
+    if accepts_gzip:
+        chunks = gzip_chunks(chunks)
+        return content_type, filename, 'gzip', caching_chunks(key, (content_type, filename, 'gzip'), chunks)
+
+    # The client gets the body as it is; the cache still keeps it gzipped.
+    return content_type, filename, None, caching_chunks(key, (content_type, filename, 'gzip'), chunks, compress=True)
+
+
+def caching_chunks(key, entry, chunks, compress=False):
+    """Yield ``chunks``, then cache ``entry`` with their body appended.
+
+    With ``compress`` the cached copy of the body is gzipped.
+    """
+    body = []
+    size = 0
+    compressor = gzip_compressor() if compress else None
+    for chunk in chunks:
+        if body is not None:
+            data = compressor.compress(chunk) if compressor else chunk
+            size += len(data)
+            if size <= EXPORT_CACHE_MAX_BYTES:
+                body.append(data)
+            else:
+                body = None
+        yield chunk
+
+    if body is not None:
+        if compressor:
+            body.append(compressor.flush())
+        caches[EXPORT_CACHE].set(key, (*entry, b''.join(body)), EXPORT_CACHE_TIMEOUT)
@@ -0,0 +1,46 @@
+"""IEC 61850 ScadaDevice configuration documents.
+
+Rendering works on plain dicts of Device field values and imports nothing
+from Django.
+"""
+from xml.sax.saxutils import escape
+
+
+# Device fields a document is rendered from.
+IEC_XML_FIELDS = ['device_name', 'ied_name', 'logical_device', 'scl_file', 'brcb', 'urcb']
+
+render_template = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<ScadaDevice xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    'xmlns="http://www.schneider-electric.com/SCADA/Drivers/IEC61850/DeviceConfig/v1/">\n'
+    '  <SCL>{scl}</SCL>\n'
+    '  <IED>{ied}</IED>\n'
+    '  <LogicalDevice Name="{logical_device}">{report_control}\n'
+    '  </LogicalDevice>\n'
+    '</ScadaDevice>'
+).format
+
+ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+
+
+def render_document(values):
+    """Render the ScadaDevice XML for one device's ``values``."""
+    device_name = values['device_name']
+    report_control = ''
+    if values['urcb']:
+        report_control += f'\n    <URCB>{escape(values["urcb"])}</URCB>'
+    if values['brcb']:
+        report_control += f'\n    <BRCB>{escape(values["brcb"])}</BRCB>'
+
+    return render_template(
+        scl=escape(values['scl_file'] or f'[USER]:{device_name}_Project\\{device_name}.cid'),
+        ied=escape(values['ied_name'] or device_name),
+        logical_device=escape(values['logical_device'] or 'Relay', ATTRIBUTE_ENTITIES),
+        report_control=report_control
+    )
+
+
+def render_documents(devices):
+    """Render a document for each dict in ``devices``, keeping their order."""
+    return [render_document(values) for values in devices]
@@ -0,0 +1,916 @@
+import codecs
+import csv
+import io
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.core.files import File
+from django.core.paginator import Paginator
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import Alarm, DataVersion, Device, ExportFragment, ImportPreviewRow, ImportJob, Trend, Variable
+
+
+BATCH_SIZE = 1000
+
+# SQLite caps the number of bound parameters per statement (999 before
+# 3.32, which Django assumes), so IN () lookups binding one parameter per
+# value are split into chunks below that limit.
+LOOKUP_CHUNK_SIZE = 500
+
+PREVIEW_PAGE_SIZE = 100
+
+# Alarm previews are discarded after a day.
+PREVIEW_TTL = timedelta(days=1)
+
+
+VARIABLE_DATA_TYPES = {
+    'REAL': 'float',
+    'INT': 'int',
+    'BOOL': 'bool',
+    'STRING': 'string',
+    'FLOAT': 'float',
+    'INTEGER': 'int',
+    'BOOLEAN': 'bool'
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def detect_encoding(uploaded_file):
+    """Return 'utf-8' if all of ``uploaded_file`` is valid UTF-8, else 'iso-8859-1'.
+
+    Reads the file chunk by chunk, so memory stays flat.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in uploaded_file.chunks():
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'iso-8859-1'
+    return 'utf-8'
+
+
+def iter_decoded_lines(uploaded_file):
+    """Yield the lines of an uploaded file, decoding it chunk by chunk.
+
+    The file is read twice: once to check that it is UTF-8, falling back
+    to ISO-8859-1 (which decodes any byte) like the whole-file decode did,
+    and once to decode it.
+    """
+    decoder = codecs.getincrementaldecoder(detect_encoding(uploaded_file))()
+    pending = ''
+    for chunk in uploaded_file.chunks():
+        lines = io.StringIO(pending + decoder.decode(chunk), newline='').readlines()
+        # A trailing partial line, or a bare CR that may be followed by LF,
+        # is carried over into the next chunk.
+        pending = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+        yield from lines
+
+    yield from io.StringIO(pending + decoder.decode(b'', final=True), newline='')
+
+
+def iter_csv_rows(uploaded_file, delimiter=';'):
+    return csv.reader(iter_decoded_lines(uploaded_file), delimiter=delimiter)
+
+
+def split_header(rows):
+    """Return ``(header, rows)``, or ``(None, None)`` without any data row."""
+    rows = iter(rows)
+    header = next(rows, None)
+    first = next(rows, None)
+    if header is None or first is None:
+        return None, None
+    return header, chain([first], rows)
+
+
+def track_progress(rows, progress, every=BATCH_SIZE):
+    """Pass ``rows`` through, reporting the number consumed to ``progress``."""
+    count = 0
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % every == 0:
+            progress(count)
+    progress(count)
+
+
+def bulk_update_rows(model, objs, fields):
+    """UPDATE ``fields`` of ``objs`` by primary key with a single executemany().
+
+    QuerySet.bulk_update() builds a CASE WHEN expression per field and row,
+    which costs milliseconds per row; a parameterised UPDATE does not.
+    """
+    if not objs:
+        return 0
+
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    model_fields = [opts.get_field(name) for name in fields]
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        quote(opts.db_table),
+        ', '.join('%s = %%s' % quote(field.column) for field in model_fields),
+        quote(opts.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in model_fields] + [obj.pk]
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(objs)
+
+
+def existing_child_rows(model, key_field, keys, fields):
+    """Map each stored ``(device_id, key)`` pair in ``keys`` to ``(pk, values)``.
+
+    ``values`` is the tuple of ``fields`` as stored. Pairs are matched as
+    row values, so every lookup is an exact probe of the (device, key)
+    unique index however many devices the pairs span; the equivalent OR of
+    ORM filters spends milliseconds compiling per device.
+    """
+    opts = model._meta
+    connection = connections[router.db_for_read(model)]
+    quote = connection.ops.quote_name
+    key_columns = (quote('device_id'), quote(opts.get_field(key_field).column))
+    columns = (quote(opts.pk.column),) + key_columns + tuple(quote(opts.get_field(name).column) for name in fields)
+
+    # Each pair binds two parameters.
+    chunk_size = min(LOOKUP_CHUNK_SIZE, (connection.features.max_query_params or 2 * LOOKUP_CHUNK_SIZE) // 2)
+
+    existing = {}
+    keys = sorted(keys)
+    with connection.cursor() as cursor:
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            cursor.execute(
+                'SELECT %s FROM %s WHERE (%s, %s) IN (VALUES %s)' % (
+                    ', '.join(columns), quote(opts.db_table), *key_columns, ', '.join(['(%s, %s)'] * len(chunk))
+                ),
+                [value for pair in chunk for value in pair]
+            )
+            for pk, device_id, key, *values in cursor.fetchall():
+                existing[(device_id, key)] = (pk, tuple(values))
+    return existing
+
+
+def bulk_upsert(model, key_field, records, fields, batch_size=BATCH_SIZE, dry_run=False):
+    """Insert or update child rows keyed by (device_id, key_field).
+
+    ``records`` maps ``(device_id, key)`` to the field values of the row.
+    Rows whose stored values already match are left alone, and nothing is
+    written with ``dry_run``. Returns a Counter of created, updated and
+    unchanged rows.
+    """
+    counts = Counter()
+    if not records:
+        return counts
+
+    existing = existing_child_rows(model, key_field, records, fields)
+
+    to_create = []
+    to_update = []
+    for (device_id, key), values in records.items():
+        current = existing.get((device_id, key))
+        if current is None:
+            to_create.append(model(device_id=device_id, **{key_field: key}, **values))
+        elif current[1] == tuple(values[name] for name in fields):
+            counts['unchanged'] += 1
+        else:
+            obj = model(pk=current[0], device_id=device_id, **{key_field: key}, **values)
+            to_update.append(obj)
+
+    counts['created'] += len(to_create)
+    counts['updated'] += len(to_update)
+
+    if not dry_run and (to_create or to_update):
+        if to_create:
+            model.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            bulk_update_rows(model, to_update, fields)
+        device_ids = {obj.device_id for obj in chain(to_create, to_update)}
+        DataVersion.bump()
+        ExportFragment.invalidate(model, device_ids)
+        Device.touch(device_ids)
+
+    return counts
+
+
+def import_variables(header, rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Bulk import VARIABLES.csv rows. Returns a Counter like bulk_upsert()."""
+    devices = {
+        name: (device_id, io_device)
+        for name, device_id, io_device in Device.objects.values_list('device_name', 'id', 'io_device')
+    }
+    fields = ['io_device', 'tag_name', 'address', 'equipment', 'data_type']
+
+    counts = Counter()
+    for batch in batched(rows, batch_size):
+        records = {}
+        for row in batch:
+            if len(row) < len(header):
+                counts['skipped'] += 1
+                continue
+
+            row_data = dict(zip(header, row))
+
+            equipment_name = row_data.get('EQUIPMENT', '').strip()
+            item_name = row_data.get('ITEM_NAME', '').strip()
+
+            if not equipment_name or not item_name:
+                counts['skipped'] += 1
+                continue
+
+            device = devices.get(equipment_name)
+            if device is None:
+                counts['skipped'] += 1
+                continue
+            device_id, device_io = device
+
+            csv_data_type = row_data.get('DATA_TYPE', 'REAL').strip().upper()
+
+            # Later rows win and count as updates, as with a per-row
+            # update_or_create.
+            key = (device_id, item_name)
+            if key in records:
+                counts['updated'] += 1
+            records[key] = {
+                'io_device': row_data.get('IO_DEVICE', device_io).strip(),
+                'tag_name': row_data.get('TAG_NAME', item_name).strip(),
+                'address': row_data.get('ADDRESS', '40001').strip(),
+                'equipment': equipment_name,
+                'data_type': VARIABLE_DATA_TYPES.get(csv_data_type, 'float')
+            }
+
+        counts += bulk_upsert(Variable, 'item_name', records, fields, batch_size, dry_run)
+
+    return counts
+
+
+class DeviceResolver:
+    """Resolve imported rows to devices without a query per row.
+
+    A row belongs to the device named by its equipment column, else to the
+    device of the variable sharing its item name, else to the device with
+    the longest ``tag_prefix`` that starts its tag name. Prefixes live in a
+    character trie, so a lookup costs the length of the tag; variable item
+    names are loaded one batch at a time. When several devices share an
+    item name or a prefix, the newest device wins.
+    """
+
+    def __init__(self):
+        self.device_names = {}
+        self.item_names = {}
+        self.prefixes = {}
+        # Oldest first, so that the newest device wins a shared prefix.
+        devices = Device.objects.order_by('created_at', 'id').values_list('id', 'device_name', 'tag_prefix')
+        for device_id, device_name, tag_prefix in devices:
+            self.device_names[device_name] = device_id
+            node = self.prefixes
+            for char in tag_prefix:
+                node = node.setdefault(char, {})
+            node[None] = device_id
+
+    def load_item_names(self, item_names):
+        missing = [name for name in set(item_names) if name not in self.item_names]
+        for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+            chunk = missing[start:start + LOOKUP_CHUNK_SIZE]
+            for name in chunk:
+                self.item_names[name] = None
+            # Newest device last, so it wins, as it does for prefixes.
+            rows = Variable.objects.filter(item_name__in=chunk) \
+                .order_by('device__created_at', 'device_id').values_list('item_name', 'device_id')
+            for name, device_id in rows:
+                self.item_names[name] = device_id
+
+    def match_prefix(self, tag_name):
+        node = self.prefixes
+        device_id = node.get(None)
+        for char in tag_name:
+            node = node.get(char)
+            if node is None:
+                break
+            device_id = node.get(None, device_id)
+        return device_id
+
+    def resolve(self, item_name, tag_name=None, device_name=None):
+        device_id = self.device_names.get(device_name) if device_name else None
+        if device_id is None:
+            device_id = self.item_names.get(item_name)
+        if device_id is None and tag_name is not None:
+            device_id = self.match_prefix(tag_name)
+        return device_id
+
+
+def parse_trend_interval(time_interval):
+    time_value = '00:01'
+
+    if 'MIN' in time_interval.upper():
+        minutes = int(''.join(filter(str.isdigit, time_interval)) or '1')
+        time_value = f'{minutes:02d}:00'
+    elif 'SEC' in time_interval.upper():
+        seconds = int(''.join(filter(str.isdigit, time_interval)) or '60')
+        time_value = f'00:{seconds:02d}'
+    elif 'HOUR' in time_interval.upper():
+        hours = int(''.join(filter(str.isdigit, time_interval)) or '1')
+        time_value = f'{hours * 60:02d}:00'
+
+    return time_value
+
+
+def import_trends(header, rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Bulk import TRENDS.csv rows. Returns a Counter like bulk_upsert()."""
+    resolver = DeviceResolver()
+    fields = ['trend_types', 'tag_name', 'item_name', 'time']
+
+    counts = Counter()
+    for batch in batched(rows, batch_size):
+        parsed = []
+        for row in batch:
+            if len(row) < len(header):
+                counts['skipped'] += 1
+                continue
+
+            row_data = dict(zip(header, row))
+
+            tag_description = row_data.get('TAG_DESCRIPTION', '').strip()
+            item_name = row_data.get('ITEM_NAME', '').strip()
+
+            if not tag_description or not item_name:
+                counts['skipped'] += 1
+                continue
+
+            parsed.append((row_data, tag_description, item_name))
+
+        resolver.load_item_names(item_name for _, _, item_name in parsed)
+
+        records = {}
+        for row_data, tag_description, item_name in parsed:
+            tag_name = row_data.get('TAG_NAME', '').strip()
+            device_id = resolver.resolve(item_name, tag_name)
+            if device_id is None:
+                counts['skipped'] += 1
+                continue
+
+            key = (device_id, tag_description)
+            if key in records:
+                counts['updated'] += 1
+            records[key] = {
+                'trend_types': row_data.get('TREND_TYPES', 'periodic').strip().lower(),
+                'tag_name': tag_name,
+                'item_name': item_name,
+                'time': parse_trend_interval(row_data.get('TIME_INTERVAL', '1MIN').strip())
+            }
+
+        counts += bulk_upsert(Trend, 'tag_description', records, fields, batch_size, dry_run)
+
+    return counts
+
+
+DEVICE_IMPORT_FIELDS = [
+    'device_type', 'tag_prefix', 'io_device', 'protocol', 'modbus_variant', 'device_ip', 'modbus_port',
+    'iec_device_ip', 'iec_port', 'port_name', 'ied_name', 'access_point', 'logical_device'
+]
+
+
+def equipment_defaults(device_name, row_data):
+    """Map an EQUIP.csv row onto the Device fields it sets."""
+    device_type = row_data.get('EQUIP_TYPE', 'PV').strip()
+    tag_prefix = row_data.get('CUSTOM01', device_name[:10]).strip()
+    io_device = row_data.get('CUSTOM02', f'IO_{device_name}').strip()
+    protocol = row_data.get('PROTOCOL', 'MODBUS').lower().strip()
+    ip_address = row_data.get('IP_ADDRESS', '').strip()
+    port = row_data.get('PORT', '502').strip()
+
+
+    if 'iec' in protocol or '61850' in protocol:
+        protocol = 'iec'
+    else:
+        protocol = 'modbus'
+
+
+    return {
+        'device_type': device_type,
+        'tag_prefix': tag_prefix,
+        'io_device': io_device,
+        'protocol': protocol,
+        'modbus_variant': 'tcp' if protocol == 'modbus' else None,
+        'device_ip': ip_address if protocol == 'modbus' else None,
+        'modbus_port': int(port) if protocol == 'modbus' and port.isdigit() else 502,
+        'iec_device_ip': ip_address if protocol == 'iec' else None,
+        'iec_port': int(port) if protocol == 'iec' and port.isdigit() else 102,
+        'port_name': f'PORT_{device_name}',
+        'ied_name': device_name if protocol == 'iec' else '',
+        'access_point': 'S1' if protocol == 'iec' else '',
+        'logical_device': 'LD0' if protocol == 'iec' else ''
+    }
+
+
+def device_fingerprint(values):
+    """The DEVICE_IMPORT_FIELDS of ``values`` as the database stores them."""
+    # Blank IP addresses are saved as NULL.
+    return tuple(
+        None if values[name] == '' and Device._meta.get_field(name).null else values[name]
+        for name in DEVICE_IMPORT_FIELDS
+    )
+
+
+def existing_devices(names):
+    """Map each stored device name in ``names`` to ``(pk, fingerprint)``."""
+    existing = {}
+    names = list(names)
+    for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+        rows = Device.objects.filter(
+            device_name__in=names[start:start + LOOKUP_CHUNK_SIZE]
+        ).values_list('device_name', 'id', *DEVICE_IMPORT_FIELDS)
+        for device_name, pk, *values in rows:
+            existing[device_name] = (pk, tuple(values))
+    return existing
+
+
+def import_equipment(header, rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Bulk import EQUIP.csv rows. Returns a Counter like bulk_upsert().
+
+    Devices whose stored fields already match their row are not written.
+    """
+    counts = Counter()
+
+    for batch in batched(rows, batch_size):
+        records = {}
+        for row in batch:
+            if len(row) < len(header):
+                counts['skipped'] += 1
+                continue
+
+            row_data = dict(zip(header, row))
+
+
+            device_name = row_data.get('ITEM_NAME', '').strip()
+            if not device_name:
+                counts['skipped'] += 1
+                continue
+
+            if device_name in records:
+                counts['updated'] += 1
+            records[device_name] = equipment_defaults(device_name, row_data)
+
+        existing = existing_devices(records)
+        changed = {}
+        for device_name, values in records.items():
+            current = existing.get(device_name)
+            if current is None:
+                counts['created'] += 1
+                changed[device_name] = None
+            elif current[1] == device_fingerprint(values):
+                counts['unchanged'] += 1
+            else:
+                counts['updated'] += 1
+                changed[device_name] = current[0]
+
+        # Validate changed rows the way Device.save() would, so a dry run
+        # fails wherever the import itself would.
+        stored = Device.objects.in_bulk([pk for pk in changed.values() if pk is not None])
+        to_create = []
+        to_update = []
+        now = timezone.now()
+        for device_name, pk in changed.items():
+            if pk is None:
+                device = Device(device_name=device_name, **records[device_name])
+                to_create.append(device)
+            else:
+                device = stored[pk]
+                for name, value in records[device_name].items():
+                    setattr(device, name, value)
+                device.updated_at = now
+                to_update.append(device)
+            device.full_clean(validate_unique=False, validate_constraints=False)
+
+        if not dry_run and changed:
+            Device.objects.bulk_create(to_create, batch_size=batch_size)
+            bulk_update_rows(Device, to_update, DEVICE_IMPORT_FIELDS + ['updated_at'])
+            DataVersion.bump(devices=bool(to_create))
+            ExportFragment.invalidate(Device, [device.pk for device in to_update])
+
+    return counts
+
+
+def parse_alarm_row(header, row, row_idx):
+    """Map an ALARMS.csv row onto Alarm fields, or None if it is unusable."""
+    if len(row) < len(header):
+
+        row.extend([''] * (len(header) - len(row)))
+
+    row_data = dict(zip(header, [cell.strip() if cell else '' for cell in row]))
+
+
+    equipment = row_data.get('Equipment', '').strip()
+    item_name = row_data.get('Item Name', '').strip()
+
+
+    alarm_name = (row_data.get('Alarm Name', '') or
+                  row_data.get('ALARM_NAME', '') or
+                  row_data.get('Tag Name', '') or
+                  row_data.get('TAG_NAME', '') or
+                  item_name).strip()
+
+
+    if not alarm_name or not item_name:
+        return None
+
+
+    data_type = row_data.get('Data Type', row_data.get('TYPE', 'ANALOG')).strip().upper()
+    alarm_type = 'analog'
+    if 'DIGITAL' in data_type or 'BOOL' in data_type:
+        alarm_type = 'digital'
+    elif 'ADVANCED' in data_type or 'COMPLEX' in data_type:
+        alarm_type = 'advanced'
+
+
+    category = row_data.get('Category', row_data.get('CATEGORY', '')).strip().lower()
+    if not category:
+        alarm_name_upper = alarm_name.upper()
+        if any(word in alarm_name_upper for word in ['CRITICAL', 'FAULT', 'FAIL', 'EMERGENCY']):
+            category = 'high'
+        elif any(word in alarm_name_upper for word in ['WARNING', 'ALERT']):
+            category = 'medium'
+        elif any(word in alarm_name_upper for word in ['INFO', 'STATUS', 'EVENT']):
+            category = 'event'
+        else:
+            category = 'low'
+
+
+    alarm_tag = (row_data.get('Alarm Tag', '') or
+                 row_data.get('ALARM_TAG', '') or
+                 alarm_name.replace(' ', '_').upper()).strip()
+
+    return {
+        'alarm_name': alarm_name,
+        'alarm_type': alarm_type,
+        'category': category,
+        'alarm_tag': alarm_tag,
+        'equipment': equipment if equipment else 'Virtual.System',
+        'item_name': item_name,
+        'comment': row_data.get('Comment', ''),
+        'row_index': row_idx
+    }
+
+
+def import_alarms(header, rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Bulk import ALARMS.csv rows. Returns a Counter like bulk_upsert()."""
+    resolver = DeviceResolver()
+    header = [col.strip() for col in header]
+    fields = ['alarm_type', 'category', 'alarm_tag', 'equipment', 'item_name']
+
+    counts = Counter()
+    row_idx = 0
+    for batch in batched(rows, batch_size):
+        parsed = []
+        for row in batch:
+            row_idx += 1
+            alarm_data = parse_alarm_row(header, row, row_idx)
+            if alarm_data is None:
+                counts['skipped'] += 1
+            else:
+                parsed.append(alarm_data)
+
+        resolver.load_item_names(alarm_data['item_name'] for alarm_data in parsed)
+
+        records = {}
+        for alarm_data in parsed:
+            device_id = resolver.resolve(alarm_data['item_name'], device_name=alarm_data['equipment'])
+            if device_id is None:
+                counts['skipped'] += 1
+                continue
+
+            key = (device_id, alarm_data['alarm_name'])
+            if key in records:
+                counts['updated'] += 1
+            records[key] = {field: alarm_data[field] for field in fields}
+
+        counts += bulk_upsert(Alarm, 'alarm_name', records, fields, batch_size, dry_run)
+
+    return counts
+
+
+def store_alarm_preview(header, rows, batch_size=BATCH_SIZE):
+    """Keep parsed alarm rows server side. Returns ``(job, count)``.
+
+    The rows hang off an ImportJob of kind 'alarm_preview', which only
+    holds them; the import jobs that upload alarms keep their own kind.
+    """
+    ImportJob.objects.filter(kind='alarm_preview', created_at__lt=timezone.now() - PREVIEW_TTL).delete()
+
+    header = [col.strip() for col in header]
+    job = ImportJob.objects.create(kind='alarm_preview', status='done')
+
+    count = 0
+    for batch in batched(enumerate(rows, 1), batch_size):
+        preview_rows = []
+        for row_idx, row in batch:
+            alarm_data = parse_alarm_row(header, row, row_idx)
+            if alarm_data is not None:
+                preview_rows.append(ImportPreviewRow(job=job, row_index=row_idx, data=alarm_data))
+        ImportPreviewRow.objects.bulk_create(preview_rows)
+        count += len(preview_rows)
+
+    job.rows_processed = count
+    job.finished_at = job.created_at
+    job.save(update_fields=['rows_processed', 'finished_at'])
+    return job, count
+
+
+def preview_page(job, page_number=1, page_size=PREVIEW_PAGE_SIZE):
+    paginator = Paginator(ImportPreviewRow.objects.filter(job=job).order_by('row_index'), page_size)
+    page = paginator.get_page(page_number)
+    return {
+        'import_id': job.id,
+        'count': paginator.count,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'alarms': [row.data for row in page]
+    }
+
+
+def dry_run_result(csv_type, counts):
+    return {
+        'success': True,
+        'dry_run': True,
+        'message': (
+            f'Dry run of {csv_type} CSV: {counts["created"]} to insert, {counts["updated"]} to update, '
+            f'{counts["unchanged"]} unchanged, {counts["skipped"]} skipped'
+        ),
+        'inserts': counts['created'],
+        'updates': counts['updated'],
+        'unchanged': counts['unchanged'],
+        'skipped': counts['skipped']
+    }
+
+
+def equipment_result(header, rows, dry_run=False, **options):
+    if dry_run:
+        return dry_run_result('equipment', import_equipment(header, rows, dry_run=True))
+
+    with transaction.atomic():
+        counts = import_equipment(header, rows)
+
+    return {
+        'success': True,
+        'message': (
+            f'Processed equipment CSV: {counts["created"]} created, {counts["updated"]} updated, '
+            f'{counts["unchanged"]} unchanged'
+        ),
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'unchanged': counts['unchanged']
+    }
+
+
+def variables_result(header, rows, dry_run=False, **options):
+    if dry_run:
+        return dry_run_result('variables', import_variables(header, rows, dry_run=True))
+
+    with transaction.atomic():
+        counts = import_variables(header, rows)
+
+    return {
+        'success': True,
+        'message': f'Processed variables CSV: {counts["created"]} variables created',
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'unchanged': counts['unchanged']
+    }
+
+
+def alarms_result(header, rows, mode='preview', dry_run=False, **options):
+    if dry_run:
+        return dry_run_result('alarms', import_alarms(header, rows, dry_run=True))
+
+    if mode == 'import':
+        with transaction.atomic():
+            counts = import_alarms(header, rows)
+
+        return {
+            'success': True,
+            'message': f'Processed alarms CSV: {counts["created"]} alarms created',
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
+            'skipped': counts['skipped']
+        }
+
+    job, count = store_alarm_preview(header, rows)
+
+    return {
+        'success': True,
+        'message': f'Processed alarms CSV: {count} alarms found',
+        **preview_page(job)
+    }
+
+
+def trends_result(header, rows, dry_run=False, **options):
+    if dry_run:
+        return dry_run_result('trends', import_trends(header, rows, dry_run=True))
+
+    with transaction.atomic():
+        counts = import_trends(header, rows)
+
+    return {
+        'success': True,
+        'message': f'Processed trends CSV: {counts["created"]} trends created',
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'unchanged': counts['unchanged']
+    }
+
+
+CSV_IMPORTERS = {
+    'equipment': equipment_result,
+    'variables': variables_result,
+    'alarms': alarms_result,
+    'trends': trends_result,
+}
+
+
+def run_csv_import(csv_type, csv_reader, progress=None, **options):
+    """Import an uploaded CSV of ``csv_type`` and return the JSON payload.
+
+    ``options`` are passed on to the importer: ``dry_run`` for any type,
+    ``mode`` for alarms.
+    """
+    try:
+        header, rows = split_header(csv_reader)
+        if header is None:
+            return {
+                'success': False,
+                'error': 'CSV file is empty or missing header row'
+            }
+
+        if progress is not None:
+            rows = track_progress(rows, progress)
+
+        return CSV_IMPORTERS[csv_type](header, rows, **options)
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Error processing {csv_type} CSV: {str(e)}'
+        }
+
+
+# Bundle members in the order they have to be applied: trends resolve
+# against variables, and variables against devices.
+BUNDLE_MEMBERS = [
+    ('EQUIP.CSV', 'equipment'),
+    ('VARIABLES.CSV', 'variables'),
+    ('ALARMS.CSV', 'alarms'),
+    ('TRENDS.CSV', 'trends'),
+]
+
+# Largest uncompressed bundle member accepted, against zip bombs.
+BUNDLE_MEMBER_MAX_BYTES = 256 * 1024 * 1024
+
+
+def bundle_result(bundle_file, progress=None):
+    """Import a zip of EQUIP/VARIABLES/ALARMS/TRENDS CSVs in a single transaction.
+
+    Members are streamed one at a time in dependency order, so memory stays
+    flat however large they are; a failing member rolls the whole bundle back.
+    """
+    try:
+        bundle = zipfile.ZipFile(bundle_file)
+    except zipfile.BadZipFile:
+        return {
+            'success': False,
+            'error': 'File must be a ZIP archive'
+        }
+
+    with bundle:
+        names = {}
+        for info in bundle.infolist():
+            names.setdefault(os.path.basename(info.filename).upper(), info)
+
+        members = [(csv_type, names[member]) for member, csv_type in BUNDLE_MEMBERS if member in names]
+        if not members:
+            return {
+                'success': False,
+                'error': 'Bundle contains none of ' + ', '.join(member for member, _ in BUNDLE_MEMBERS)
+            }
+
+        # Checked before anything is read; zipfile never inflates a member
+        # past the size its header declares.
+        for csv_type, info in members:
+            if info.file_size > BUNDLE_MEMBER_MAX_BYTES:
+                return {
+                    'success': False,
+                    'error': f'{os.path.basename(info.filename)} is larger than '
+                             f'{BUNDLE_MEMBER_MAX_BYTES // (1024 * 1024)} MB uncompressed'
+                }
+
+        results = {}
+        rows_applied = 0
+        current = members[0][1].filename
+        try:
+            with transaction.atomic():
+                for csv_type, info in members:
+                    current = info.filename
+                    with bundle.open(info) as member:
+                        header, rows = split_header(iter_csv_rows(File(member)))
+                        if header is None:
+                            raise ValueError('CSV file is empty or missing header row')
+
+                        step_rows = [0]
+
+                        def step_progress(count):
+                            step_rows[0] = count
+                            if progress is not None:
+                                progress(rows_applied + count)
+
+                        results[csv_type] = CSV_IMPORTERS[csv_type](
+                            header, track_progress(rows, step_progress), mode='import'
+                        )
+                        rows_applied += step_rows[0]
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Error processing {os.path.basename(current)}: {str(e)}'
+            }
+
+    return {
+        'success': True,
+        'message': 'Processed project bundle: ' + ', '.join(os.path.basename(info.filename) for _, info in members),
+        'rows': rows_applied,
+        'results': results
+    }
+
+
+def cid_result(cid_file):
+    """Parse an uploaded CID file and return the JSON payload."""
+    content = cid_file.read().decode('utf-8')
+
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return {
+            'success': False,
+            'error': 'Invalid XML format'
+        }
+
+    return {
+        'success': True,
+        'device_info': parse_cid_data(root),
+        'message': 'CID file parsed successfully'
+    }
+
+
+def parse_cid_data(root):
+
+    device_info = {}
+
+
+    comm = root.find('.//{http://www.iec.ch/61850/2003/SCL}Communication')
+    if comm is not None:
+        connected_ap = comm.find('.//{http://www.iec.ch/61850/2003/SCL}ConnectedAP')
+        if connected_ap is not None:
+            device_info['ied_name'] = connected_ap.get('iedName', '')
+            device_info['access_point'] = connected_ap.get('apName', '')
+
+
+            address = connected_ap.find('.//{http://www.iec.ch/61850/2003/SCL}Address')
+            if address is not None:
+                ip_elem = address.find('.//{http://www.iec.ch/61850/2003/SCL}P[@type="IP"]')
+                if ip_elem is not None:
+                    device_info['iec_device_ip'] = ip_elem.text
+
+
+    ied = root.find('.//{http://www.iec.ch/61850/2003/SCL}IED')
+    if ied is not None:
+        device_info['device_name'] = ied.get('name', 'IED_Device')
+        device_info['device_type'] = ied.get('type', 'IED')
+        device_info['tag_prefix'] = (ied.get('name', 'IED')[:10]).upper()
+
+
+        ld = ied.find('.//{http://www.iec.ch/61850/2003/SCL}LDevice')
+        if ld is not None:
+            device_info['logical_device'] = ld.get('inst', 'LD0')
+
+
+    device_info.setdefault('iec_port', 102)
+    device_info.setdefault('protocol', 'iec')
+    device_info.setdefault('io_device', f"IO_{device_info.get('device_name', 'IED_Device')}")
+
+    return device_info
@@ -0,0 +1,195 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers run a single process.
+    fcntl = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .importers import bundle_result, cid_result, iter_csv_rows, run_csv_import
+from .models import ImportJob
+
+
+logger = logging.getLogger(__name__)
+
+# One thread per process drains pending jobs from the database.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-job')
+
+# Imports write in one long transaction, and SQLite has a single write
+# lock, so jobs run one at a time across every worker process. The lock is
+# an flock, which the kernel releases if its process dies.
+IMPORT_LOCK_FILE = os.path.join(settings.MEDIA_ROOT, 'imports', '.lock')
+
+# Progress is published through the shared cache because the job's own row
+# is only written once its import transaction has committed.
+PROGRESS_KEY = 'import-job:{}:rows'
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+
+@contextmanager
+def import_lock():
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(IMPORT_LOCK_FILE), exist_ok=True)
+    with open(IMPORT_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def enqueue_import(kind, uploaded_file, **options):
+    """Persist ``uploaded_file`` as a new pending ImportJob and wake the worker."""
+    job = ImportJob(kind=kind, options=options)
+    job.upload.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+
+    transaction.on_commit(lambda: executor.submit(work))
+    return job
+
+
+def resume_import_jobs():
+    """Pick up the jobs a previous server process left behind; call at startup."""
+    executor.submit(work)
+
+
+def work():
+    """Executor entry point: drain the queue, logging what would be lost in the Future."""
+    try:
+        run_pending_jobs()
+    except Exception:
+        logger.exception('Import worker failed')
+    finally:
+        connection.close()
+
+
+def run_pending_jobs():
+    """Run pending jobs, oldest first, until there are none left."""
+    with import_lock():
+        # Only the lock holder runs jobs, so a job still marked running
+        # was interrupted by a restart. Its transaction rolled back; it
+        # is failed rather than rerun, in case it is what took the
+        # process down.
+        for job in ImportJob.objects.filter(status='running'):
+            fail_job(job, 'Interrupted by a server restart')
+
+        # Jobs that could not even be marked failed are skipped, so one
+        # bad row cannot stall the queue; the next run retries them.
+        attempted = set()
+        while True:
+            job = ImportJob.objects.filter(status='pending').exclude(pk__in=attempted) \
+                .order_by('created_at', 'id').first()
+            if job is None:
+                return
+            attempted.add(job.pk)
+            try:
+                run_import_job(job)
+            except Exception as e:
+                logger.exception('Import job %s failed', job.pk)
+                fail_job(job, e)
+
+
+def run_import_job(job):
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    progress_key = PROGRESS_KEY.format(job.pk)
+
+    def progress(count):
+        cache.set(progress_key, count, PROGRESS_TIMEOUT)
+
+    try:
+        with job.upload.open('rb') as upload:
+            if job.kind == 'cid':
+                result = cid_result(upload)
+            elif job.kind == 'bundle':
+                result = bundle_result(upload, progress)
+            else:
+                result = run_csv_import(job.kind, iter_csv_rows(upload), progress, **job.options)
+    except Exception as e:
+        result = {
+            'success': False,
+            'error': str(e)
+        }
+
+    job.rows_processed = cache.get(progress_key, job.rows_processed)
+    finish_job(job, result)
+    cache.delete(progress_key)
+
+
+def finish_job(job, result):
+    job.result = result
+    job.finished_at = timezone.now()
+    if result.get('success'):
+        job.status = 'done'
+    else:
+        job.status = 'failed'
+        job.errors = [result.get('error', 'Unknown error')]
+    # Nothing reruns a finished job, so its upload is no longer needed.
+    try:
+        job.upload.delete(save=False)
+    except OSError:
+        logger.exception('Could not delete the upload of import job %s', job.pk)
+    job.save()
+
+
+def fail_job(job, error):
+    """Mark ``job`` failed with ``error`` without running it, e.g. after its run raised.
+
+    Writes only the status columns, so it works whatever state the failed
+    run left ``job`` in. Errors are logged rather than raised.
+    """
+    upload = job.upload.name
+    try:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            finished_at=timezone.now(),
+            errors=[str(error)],
+            result={'success': False, 'error': str(error)},
+            upload=''
+        )
+    except Exception:
+        logger.exception('Could not mark import job %s failed', job.pk)
+        return
+
+    try:
+        if upload:
+            job.upload.storage.delete(upload)
+    except OSError:
+        logger.exception('Could not delete the upload of import job %s', job.pk)
+
+
+def describe_job(job):
+    rows_processed = job.rows_processed
+    if job.status == 'running':
+        rows_processed = cache.get(PROGRESS_KEY.format(job.pk), rows_processed)
+
+    rows_per_second = 0
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_second = round(rows_processed / elapsed, 1)
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'rows_processed': rows_processed,
+        'rows_per_second': rows_per_second,
+        'errors': job.errors,
+        'result': job.result,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
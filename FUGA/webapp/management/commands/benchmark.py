@@ -0,0 +1,458 @@
+import csv
+import io
+import json
+import time
+import tracemalloc
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+
+from webapp.exporters import CSV_EXPORTS, DATA_TYPE_MAPPING
+from webapp.iec_xml import IEC_XML_FIELDS, render_documents
+from webapp.importers import import_equipment, import_trends, import_variables
+from webapp.models import DataVersion, Device, ExportFragment, Variable
+
+
+EQUIP_HEADER = ['ITEM_NAME', 'EQUIP_TYPE', 'CUSTOM01', 'CUSTOM02', 'PROTOCOL', 'IP_ADDRESS', 'PORT']
+VARIABLES_HEADER = ['EQUIPMENT', 'ITEM_NAME', 'TAG_NAME', 'IO_DEVICE', 'DATA_TYPE', 'ADDRESS']
+ALARMS_HEADER = ['Equipment', 'Item Name', 'Alarm Name', 'Data Type', 'Category', 'Alarm Tag']
+TRENDS_HEADER = ['TAG_DESCRIPTION', 'TREND_TYPES', 'TAG_NAME', 'ITEM_NAME', 'TIME_INTERVAL']
+
+CSV_TYPES = ['equipment', 'units', 'variables', 'alarms', 'trends']
+
+# The benchmark keeps its cached exports and documents to itself.
+BENCHMARK_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{alias}'}
+    for alias in ['default', 'exports']
+}
+
+
+def measure(name, func):
+    """Run ``func`` and return its result with wall time, query count and peak memory.
+
+    Streaming responses are drained inside the measurement. Peak memory is
+    what tracemalloc saw allocated by Python, and tracing slows every run
+    alike, so numbers are comparable between commits rather than absolute.
+    """
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = func()
+        if getattr(result, 'streaming', False):
+            result.content_length = sum(len(chunk) for chunk in result.streaming_content)
+        elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, {
+        'name': name,
+        'seconds': round(elapsed, 4),
+        'queries': len(queries),
+        'peak_memory_kb': peak // 1024,
+    }
+
+
+def create_devices(count):
+    Device.objects.bulk_create([
+        Device(
+            device_name=f'DEV_{index:05d}',
+            device_type='PV',
+            tag_prefix=f'D{index:05d}',
+            io_device=f'IO_DEV_{index:05d}',
+            protocol='modbus',
+            modbus_variant='tcp'
+        ) for index in range(count)
+    ])
+
+
+def equipment_rows(size, port='502'):
+    for index in range(size):
+        yield [f'DEV_{index:05d}', 'PV', f'D{index:05d}', f'IO_DEV_{index:05d}', 'MODBUS', f'10.0.{index // 250}.{index % 250}', port]
+
+
+def count_record(counts, record):
+    record.update(created=counts['created'], updated=counts['updated'], unchanged=counts['unchanged'])
+    return record
+
+
+def bench_equipment(size, **options):
+    passes = (('insert', '502'), ('reimport', '502'), ('update', '503'))
+    for label, port in passes:
+        with transaction.atomic():
+            counts, record = measure(f'import_equipment {label}', lambda: import_equipment(EQUIP_HEADER, equipment_rows(size, port)))
+        yield count_record(counts, record)
+
+
+def variable_rows(size, device_count, data_type='REAL'):
+    for index in range(size):
+        device = f'DEV_{index % device_count:05d}'
+        yield [device, f'VAR_{index:06d}', f'TAG_{index:06d}', f'IO_{device}', data_type, str(40001 + index % 1000)]
+
+
+def bench_variables(size, **options):
+    device_count = max(1, size // 1000)
+    create_devices(device_count)
+
+    # The update pass changes every row; an identical re-import is all unchanged.
+    for label, data_type in (('insert', 'REAL'), ('update', 'INT')):
+        with transaction.atomic():
+            counts, record = measure(
+                f'import_variables {label}',
+                lambda: import_variables(VARIABLES_HEADER, variable_rows(size, device_count, data_type))
+            )
+        yield count_record(counts, record)
+
+
+def trend_rows(size, device_count, trend_type='periodic'):
+    # Even rows resolve through a variable item name, odd rows through the
+    # longest matching tag prefix.
+    for index in range(size):
+        device = index % device_count
+        item_name = f'VAR_{device:05d}' if index % 2 == 0 else f'ITEM_{index:06d}'
+        yield [f'Trend {index:06d}', trend_type, f'D{device:05d}_T{index:06d}', item_name, '1MIN']
+
+
+def bench_trends(size, **options):
+    device_count = 2000
+    create_devices(device_count)
+    Variable.objects.bulk_create([
+        Variable(device_id=device_id, item_name=f'VAR_{index:05d}', tag_name=f'D{index:05d}_VAR')
+        for index, device_id in enumerate(Device.objects.order_by('device_name').values_list('id', flat=True))
+    ])
+
+    for label, trend_type in (('insert', 'periodic'), ('update', 'event')):
+        with transaction.atomic():
+            counts, record = measure(
+                f'import_trends {label}',
+                lambda: import_trends(TRENDS_HEADER, trend_rows(size, device_count, trend_type))
+            )
+        yield count_record(counts, record)
+
+
+def synthetic_device(index):
+    """Field values for the ``index``-th device of a synthetic substation.
+
+    Devices cycle through Modbus TCP, Modbus RTU and IEC 61850.
+    """
+    name = f'SUB_{index:05d}'
+    device = {
+        'device_name': name,
+        'device_type': Device.DEVICE_TYPE_CHOICES[index % len(Device.DEVICE_TYPE_CHOICES)][0],
+        'tag_prefix': f'S{index:05d}',
+        'io_device': f'IO_{name}',
+    }
+    address = f'10.{index // 62500}.{index // 250 % 250}.{index % 250 + 1}'
+    variant = index % 3
+
+    if variant == 0:
+        device.update(protocol='modbus', modbus_variant='tcp', device_ip=address, port_name=f'PORT_{name}', unit_number=1)
+    elif variant == 1:
+        device.update(
+            protocol='modbus', modbus_variant='rtu', gateway_address=address, slave_id=index % 247 + 1,
+            port_name_rtu=f'RTU_{index % 8}', serial_port=f'COM{index % 8 + 1}'
+        )
+    else:
+        device.update(
+            protocol='iec', iec_device_ip=address, ied_name=f'IED_{index:05d}', access_point='S1',
+            logical_device='LD0', brcb=f'brcb{index:02d}', urcb=f'urcb{index:02d}'
+        )
+    return device
+
+
+def synthetic_children(device, variables, alarms, trends):
+    """Child field values for ``device``, keyed like the save_device payload."""
+    name = device['device_name']
+    prefix = device['tag_prefix']
+    return {
+        'variables': [{
+            'item_name': f'{prefix}_VAR_{index:04d}',
+            'io_device': device['io_device'],
+            'tag_name': f'{prefix}_TAG_{index:04d}',
+            'address': str(40001 + index),
+            'equipment': name,
+            'data_type': 'float',
+        } for index in range(variables)],
+        'alarms': [{
+            'alarm_name': f'{name} Fault {index:04d}',
+            'alarm_type': 'digital' if index % 2 else 'analog',
+            'category': 'high',
+            'alarm_tag': f'{prefix}_ALM_{index:04d}',
+            'equipment': name,
+            'item_name': f'{prefix}_VAR_{index % max(variables, 1):04d}',
+        } for index in range(alarms)],
+        'trends': [{
+            'tag_description': f'{name} Trend {index:04d}',
+            'trend_types': 'periodic',
+            'tag_name': f'{prefix}_TAG_{index:04d}',
+            'item_name': f'{prefix}_VAR_{index % max(variables, 1):04d}',
+            'time': '01:00',
+        } for index in range(trends)],
+    }
+
+
+def synthetic_csv_files(devices, variables, alarms, trends):
+    """Render VARIABLES, ALARMS and TRENDS uploads for ``devices`` in importer format."""
+    rows = {'variables': [VARIABLES_HEADER], 'alarms': [ALARMS_HEADER], 'trends': [TRENDS_HEADER]}
+    for device in devices:
+        children = synthetic_children(device, variables, alarms, trends)
+        rows['variables'] += [
+            [v['equipment'], v['item_name'], v['tag_name'], v['io_device'], 'REAL', v['address']]
+            for v in children['variables']
+        ]
+        rows['alarms'] += [
+            [a['equipment'], a['item_name'], a['alarm_name'], a['alarm_type'].upper(), a['category'], a['alarm_tag']]
+            for a in children['alarms']
+        ]
+        rows['trends'] += [
+            [t['tag_description'], t['trend_types'], t['tag_name'], t['item_name'], '1MIN']
+            for t in children['trends']
+        ]
+    return {
+        csv_type: '\r\n'.join(';'.join(row) for row in lines).encode('utf-8')
+        for csv_type, lines in rows.items()
+    }
+
+
+def bench_project(size, variables=20, alarms=10, trends=10, **options):
+    """Time the import and export endpoints on a ``size``-device synthetic project."""
+    client = Client()
+    devices = [synthetic_device(index) for index in range(size)]
+
+    # EQUIP.csv can only create Modbus TCP devices, so the mixed project is
+    # seeded directly and its EQUIP.csv upload times a re-import.
+    Device.objects.bulk_create([Device(**device) for device in devices])
+    equip = [';'.join(EQUIP_HEADER)]
+    for device in Device.objects.order_by('id'):
+        if device.protocol == 'iec':
+            protocol, address, port = 'IEC61850', device.iec_device_ip, device.iec_port
+        else:
+            protocol, address, port = 'MODBUS', device.device_ip or '', device.modbus_port
+        equip.append(';'.join([
+            device.device_name, device.device_type, device.tag_prefix, device.io_device, protocol, address, str(port)
+        ]))
+    uploads = {'equipment': '\r\n'.join(equip).encode('utf-8')}
+    uploads.update(synthetic_csv_files(devices, variables, alarms, trends))
+
+    def run(name, func):
+        response, record = measure(name, func)
+        record['status'] = response.status_code
+        record['bytes'] = getattr(response, 'content_length', None) or len(response.content)
+        return response, record
+
+    for csv_type in ['equipment', 'variables', 'alarms', 'trends']:
+        data = {
+            'type': csv_type,
+            'mode': 'import',
+            'file': SimpleUploadedFile(f'{csv_type.upper()}.csv', uploads[csv_type], content_type='text/csv'),
+        }
+        yield run(f'upload_csv {csv_type}', lambda: client.post(reverse('webapp:upload_csv'), data))[1]
+
+    for csv_type in CSV_TYPES:
+        yield run(f'generate_csv {csv_type}', lambda: client.get(reverse('webapp:generate_csv'), {'type': csv_type}))[1]
+
+    yield run('generate_all_iec_files', lambda: client.get(reverse('webapp:generate_all_iec_files')))[1]
+    yield run('generate_modbus_bundle', lambda: client.get(reverse('webapp:generate_modbus_bundle')))[1]
+
+    payload = dict(synthetic_device(size), **synthetic_children(synthetic_device(size), variables, alarms, trends))
+    response, record = run('save_device create', lambda: client.post(
+        reverse('webapp:save_device'), json.dumps(payload), content_type='application/json'
+    ))
+    yield record
+
+    payload['id'] = response.json()['device_id']
+    payload['io_device'] = f'IO_{payload["device_name"]}_2'
+    yield run('save_device update', lambda: client.post(
+        reverse('webapp:save_device'), json.dumps(payload), content_type='application/json'
+    ))[1]
+
+    for protocol in ['modbus', 'iec']:
+        device_id = Device.objects.filter(protocol=protocol).values_list('id', flat=True).first()
+        yield run(f'get_device {protocol}', lambda: client.get(reverse('webapp:get_device', args=[device_id])))[1]
+
+    # Only the saved device's export fragments are stale now.
+    for csv_type in CSV_TYPES:
+        yield run(
+            f'generate_csv {csv_type} after save',
+            lambda: client.get(reverse('webapp:generate_csv'), {'type': csv_type})
+        )[1]
+
+
+def bench_iec_xml(size, **options):
+    """Render ``size`` IED configuration documents, then time the export endpoint.
+
+    The endpoint is timed on the same fleet, cold and then from the export
+    cache.
+    """
+    Device.objects.bulk_create([Device(**synthetic_device(index * 3 + 2)) for index in range(size)])
+    devices = list(Device.objects.filter(protocol='iec').order_by('id').values(*IEC_XML_FIELDS))
+
+    yield measure('render_documents', lambda: render_documents(devices))[1]
+
+    client = Client()
+    for label in ['cold', 'warm']:
+        yield measure(f'generate_iec_xml_only {label}', lambda: client.get(reverse('webapp:generate_iec_xml_only')))[1]
+
+
+def model_variables_csv():
+    """VARIABLES.csv rendered the way it was before the export engine.
+
+    Every Device and Variable is loaded as a model instance and the data
+    type table is rebuilt per row; kept as the reference for bench_variables_csv.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(CSV_EXPORTS['variables'][1])
+    for device in Device.objects.all():
+        for variable in device.variables.all():
+            data_type_mapping = {'float': 'REAL', 'int': 'INT', 'bool': 'BOOL', 'string': 'STRING'}
+            writer.writerow([
+                variable.equipment or device.device_name,
+                variable.item_name,
+                variable.tag_name,
+                variable.io_device or device.io_device,
+                data_type_mapping.get(variable.data_type, 'REAL'),
+                variable.address,
+                '',
+                f'{variable.item_name} from {device.device_name}',
+                '',
+                ''
+            ])
+    return output.getvalue()
+
+
+def bench_variables_csv(size, **options):
+    """Time VARIABLES.csv for ``size`` variables against the model-instance reference."""
+    device_count = max(1, size // 100)
+    create_devices(device_count)
+    device_ids = list(Device.objects.values_list('id', flat=True))
+    data_types = list(DATA_TYPE_MAPPING)
+    Variable.objects.bulk_create([
+        Variable(
+            device_id=device_ids[index % device_count],
+            item_name=f'VAR_{index:06d}',
+            tag_name=f'TAG_{index:06d}',
+            data_type=data_types[index % len(data_types)],
+            address=str(40001 + index % 1000),
+            equipment='' if index % 3 else f'EQ_{index % 7}',
+        ) for index in range(size)
+    ], batch_size=5000)
+
+    expected, reference = measure('model instances', model_variables_csv)
+    yield reference
+
+    client = Client()
+
+    def export():
+        response = client.get(reverse('webapp:generate_csv'), {'type': 'variables'})
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    # A new data version misses the export cache, so the cold pass renders
+    # every fragment and the second pass reuses them.
+    DataVersion.bump()
+    ExportFragment.objects.all().delete()
+    for label in ['cold', 'fragments']:
+        content, record = measure(f'generate_csv variables {label}', export)
+        if sorted(content.splitlines()) != sorted(expected.splitlines()):
+            raise CommandError('generate_csv variables differs from the model-instance reference')
+        record['speedup'] = round(reference['seconds'] / record['seconds'], 1)
+        yield record
+        DataVersion.bump()
+
+
+def bench_bulk_save(size, variables=20, alarms=10, trends=10, **options):
+    """Save ``size`` new devices one save_device call at a time, then in one bulk-save call.
+
+    save_device leaves the report control blocks IEC devices need unset,
+    so both passes save the synthetic project's Modbus devices.
+    """
+    client = Client()
+    documents = []
+    index = 0
+    while len(documents) < 2 * size:
+        device = synthetic_device(index)
+        if device['protocol'] == 'modbus':
+            documents.append(dict(device, **synthetic_children(device, variables, alarms, trends)))
+        index += 1
+
+    def save_one_by_one():
+        for document in documents[:size]:
+            response = client.post(reverse('webapp:save_device'), json.dumps(document), content_type='application/json')
+        return response
+
+    def bulk_save():
+        return client.post(reverse('webapp:bulk_save_devices'), json.dumps(documents[size:]), content_type='application/json')
+
+    for name, func in [('save_device x size', save_one_by_one), ('bulk_save_devices', bulk_save)]:
+        response, record = measure(name, func)
+        if response.status_code != 200:
+            raise CommandError(f'{name} failed: {response.content[:200]}')
+        record['devices_per_second'] = round(size / record['seconds'], 1)
+        yield record
+
+
+SUITES = {
+    'equipment': (bench_equipment, '5000'),
+    'variables': (bench_variables, '1000,10000,100000'),
+    'trends': (bench_trends, '50000'),
+    'project': (bench_project, '100,1000'),
+    'variables_csv': (bench_variables_csv, '200000'),
+    'bulk_save': (bench_bulk_save, '1000'),
+    'iec_xml': (bench_iec_xml, '10000'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the importers and API endpoints against a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument('--sizes', help='Comma separated row counts, or device counts for the project suite')
+        parser.add_argument('--variables', type=int, default=20, help='Variables per device in the project suite')
+        parser.add_argument('--alarms', type=int, default=10, help='Alarms per device in the project suite')
+        parser.add_argument('--trends', type=int, default=10, help='Trends per device in the project suite')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        bench, default_sizes = SUITES[options['suite']]
+        sizes = [int(size) for size in (options['sizes'] or default_sizes).split(',')]
+
+        results = []
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                for size in sizes:
+                    # Each size's writes are rolled back, so nothing cached
+                    # for one size may be served to the next.
+                    for cache in caches.all():
+                        cache.clear()
+                    with transaction.atomic():
+                        for record in bench(
+                            size, variables=options['variables'], alarms=options['alarms'], trends=options['trends']
+                        ):
+                            record['size'] = size
+                            results.append(record)
+                            line = (
+                                f'{record["name"]:<36} size={size:<7} {record["seconds"]:9.3f}s '
+                                f'queries={record["queries"]:<7} peak={record["peak_memory_kb"]:>8} KiB'
+                            )
+                            if 'speedup' in record:
+                                line += f' speedup={record["speedup"]}x'
+                            if 'devices_per_second' in record:
+                                line += f' devices/s={record["devices_per_second"]}'
+                            self.stdout.write(line)
+                        transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'suite': options['suite'], 'results': results}, output, indent=2)
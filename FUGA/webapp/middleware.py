@@ -0,0 +1,16 @@
+from django.middleware.gzip import GZipMiddleware
+
+from .exporters import COMPRESSED_CONTENT_TYPES
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Gzip responses for clients that accept it.
+
+    Zip downloads are deflated member by member already, so they are sent
+    as they are rather than compressed a second time.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').split(';')[0] in COMPRESSED_CONTENT_TYPES:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('equipment', 'Equipment CSV'), ('variables', 'Variables CSV'), ('alarms', 'Alarms CSV'), ('trends', 'Trends CSV'), ('cid', 'CID File'), ('bundle', 'Project Bundle')], max_length=20),
+        ),
+    ]
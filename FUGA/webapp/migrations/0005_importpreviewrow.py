@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0004_importjob_bundle_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='ImportPreviewRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_index', models.IntegerField()),
+                ('data', models.JSONField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='preview_rows', to='webapp.importjob')),
+            ],
+            options={
+                'ordering': ['row_index'],
+                'unique_together': {('job', 'row_index')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0006_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportFragment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('equipment', 'EQUIP.csv rows'), ('units', 'UNITS.csv rows'), ('variables', 'VARIABLES.csv rows'), ('alarms', 'ALARMS.csv rows'), ('trends', 'TRENDS.csv rows'), ('iec_equip', 'IEC_EQUIP.csv rows'), ('iec_ports', 'IEC_PORTS.csv rows'), ('iec_xml', 'IEC device XML')], max_length=20)),
+                ('content', models.TextField(blank=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_fragments', to='webapp.device')),
+            ],
+            options={
+                'unique_together': {('device', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0007_exportfragment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['-created_at', 'id'], name='device_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# Source table, rowid offset, and the columns mirrored as tag, name and detail.
+# Search rows are keyed ``id * 3 + offset`` so all three tables share one index.
+SOURCES = [
+    ('webapp_variable', 0, 'tag_name', 'item_name', 'equipment'),
+    ('webapp_alarm', 1, 'alarm_tag', 'alarm_name', 'equipment'),
+    ('webapp_trend', 2, 'tag_name', 'tag_description', 'item_name'),
+]
+
+
+def source_statements(table, offset, tag, name, detail):
+    columns = f'{tag}, {name}, {detail}'
+    new_values = f'new.{tag}, new.{name}, new.{detail}'
+    return [
+        f"INSERT INTO webapp_tag_search (rowid, tag, name, detail) "
+        f"SELECT id * 3 + {offset}, {columns} FROM {table}",
+
+        f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO webapp_tag_search (rowid, tag, name, detail) VALUES (new.id * 3 + {offset}, {new_values}); "
+        f"END",
+
+        f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"DELETE FROM webapp_tag_search WHERE rowid = old.id * 3 + {offset}; "
+        f"INSERT INTO webapp_tag_search (rowid, tag, name, detail) VALUES (new.id * 3 + {offset}, {new_values}); "
+        f"END",
+
+        f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM webapp_tag_search WHERE rowid = old.id * 3 + {offset}; "
+        f"END",
+    ]
+
+
+def trigram_fts5_available(connection):
+    """Whether ``connection`` can create FTS5 tables with the trigram tokenizer.
+
+    That takes SQLite 3.34 built with FTS5; Django supports older builds.
+    """
+    if connection.vendor != 'sqlite' or connection.Database.sqlite_version_info < (3, 34, 0):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_tag_search(apps, schema_editor):
+    # Without FTS5 trigrams there is no index; search falls back to LIKE.
+    if not trigram_fts5_available(schema_editor.connection):
+        return
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE webapp_tag_search USING fts5(tag, name, detail, tokenize='trigram')"
+    )
+    for source in SOURCES:
+        for statement in source_statements(*source):
+            schema_editor.execute(statement)
+
+
+def drop_tag_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    for table, *columns in SOURCES:
+        for action in ('insert', 'update', 'delete'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_search_{action}")
+    schema_editor.execute("DROP TABLE IF EXISTS webapp_tag_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0008_device_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_tag_search, drop_tag_search),
+    ]
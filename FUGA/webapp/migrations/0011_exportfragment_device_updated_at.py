@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0010_dataversion_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportfragment',
+            name='device_updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
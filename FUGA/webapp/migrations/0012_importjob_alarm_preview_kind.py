@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+def mark_alarm_previews(apps, schema_editor):
+    # Preview holders were created finished, never started; import jobs
+    # that ran get a started_at.
+    ImportJob = apps.get_model('webapp', 'ImportJob')
+    ImportJob.objects.filter(
+        kind='alarms', status='done', started_at__isnull=True, options__mode='preview'
+    ).update(kind='alarm_preview')
+
+
+def unmark_alarm_previews(apps, schema_editor):
+    ImportJob = apps.get_model('webapp', 'ImportJob')
+    ImportJob.objects.filter(kind='alarm_preview').update(kind='alarms', options={'mode': 'preview'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0011_exportfragment_device_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('equipment', 'Equipment CSV'), ('variables', 'Variables CSV'), ('alarms', 'Alarms CSV'), ('trends', 'Trends CSV'), ('cid', 'CID File'), ('bundle', 'Project Bundle'), ('alarm_preview', 'Alarm Preview')], max_length=20),
+        ),
+        migrations.RunPython(mark_alarm_previews, unmark_alarm_previews),
+    ]
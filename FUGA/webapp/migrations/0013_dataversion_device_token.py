@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:56
+
+import webapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0012_importjob_alarm_preview_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='device_token',
+            field=models.CharField(default=webapp.models.new_version_token, max_length=16),
+        ),
+    ]
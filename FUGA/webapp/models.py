@@ -1,6 +1,18 @@
+from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 import json
+import secrets
+
+
+# Keyed to DataVersion.device_token, which every device create and delete
+# redraws in its own transaction, so a count is never served after the
+# write that changed it, while writes to variables, alarms and trends leave
+# it cached. The timeout drops counts for past tokens, and bounds how long
+# a write made around the ORM (raw SQL, a restored backup) can go unnoticed.
+DEVICE_COUNT_CACHE_KEY = 'device:count:{}'
+DEVICE_COUNT_TIMEOUT = 5 * 60
 
 
 class Device(models.Model):
@@ -71,10 +83,33 @@ class Device(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Serves the device list's keyset pages and the export order.
+            models.Index(fields=['-created_at', 'id'], name='device_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.device_name} ({self.device_type})"
 
+    @classmethod
+    def touch(cls, device_ids):
+        """Mark ``device_ids`` as updated now, e.g. after writes to their variables, alarms or trends."""
+        device_ids = list(device_ids)
+        now = timezone.now()
+        for start in range(0, len(device_ids), 500):
+            cls.objects.filter(id__in=device_ids[start:start + 500]).update(updated_at=now)
+
+    @classmethod
+    def cached_count(cls):
+        """Return the number of devices, cached until devices are created or deleted."""
+        # Read the token first; a count taken after it is never older.
+        key = DEVICE_COUNT_CACHE_KEY.format(DataVersion.current_devices())
+        count = cache.get(key)
+        if count is None:
+            count = cls.objects.count()
+            cache.set(key, count, DEVICE_COUNT_TIMEOUT)
+        return count
+
     def clean(self):
         """Custom validation for IEC devices"""
         from django.core.exceptions import ValidationError
@@ -174,4 +209,139 @@ class Trend(models.Model):
         ordering = ['tag_description']
 
     def __str__(self):
-        return f"{self.device.device_name} - {self.tag_description}"
\ No newline at end of file
+        return f"{self.device.device_name} - {self.tag_description}"
+
+class ImportJob(models.Model):
+    KIND_CHOICES = [
+        ('equipment', 'Equipment CSV'),
+        ('variables', 'Variables CSV'),
+        ('alarms', 'Alarms CSV'),
+        ('trends', 'Trends CSV'),
+        ('cid', 'CID File'),
+        ('bundle', 'Project Bundle'),
+        ('alarm_preview', 'Alarm Preview'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    upload = models.FileField(upload_to='imports/', blank=True)
+    options = models.JSONField(default=dict, blank=True)
+    rows_processed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import #{self.pk} ({self.status})"
+
+
+class ImportPreviewRow(models.Model):
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='preview_rows')
+    row_index = models.IntegerField()
+    data = models.JSONField()
+
+    class Meta:
+        unique_together = ['job', 'row_index']
+        ordering = ['row_index']
+
+    def __str__(self):
+        return f"Import #{self.job_id} - row {self.row_index}"
+
+
+def new_version_token():
+    return secrets.token_hex(8)
+
+
+class DataVersion(models.Model):
+    """Project-wide counter bumped on every Device, Variable, Alarm or Trend write.
+
+    Exports are cached and tagged by this version. There is a single row.
+    Each bump also draws a new random token, so a counter value that comes
+    back after a rollback or a restored database never names stale caches.
+    ``device_token`` is redrawn only when devices are created or deleted.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    token = models.CharField(max_length=16, default=new_version_token)
+    device_token = models.CharField(max_length=16, default=new_version_token)
+
+    def __str__(self):
+        return f"Data version {self.version}"
+
+    @classmethod
+    def current(cls):
+        row = cls.objects.filter(pk=1).values_list('version', 'token').first()
+        return f'{row[0]}.{row[1]}' if row else '0'
+
+    @classmethod
+    def current_devices(cls):
+        """Return the token of the current set of devices."""
+        return cls.objects.filter(pk=1).values_list('device_token', flat=True).first() or '0'
+
+    @classmethod
+    def bump(cls, devices=False):
+        """Move the version on; with ``devices`` after devices were created or deleted."""
+        values = {'version': models.F('version') + 1, 'token': new_version_token()}
+        if devices:
+            values['device_token'] = new_version_token()
+        if not cls.objects.filter(pk=1).update(**values):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(**values)
+
+
+class ExportFragment(models.Model):
+    """A device's pre-rendered share of one export, e.g. its VARIABLES.csv rows.
+
+    Exports concatenate fragments in device order and render only the
+    missing ones. A fragment is stamped with the ``updated_at`` its device
+    had when rendering began, and every write to a device or its children
+    moves that on, so a fragment whose stamp no longer matches is stale.
+    """
+    KIND_CHOICES = [
+        ('equipment', 'EQUIP.csv rows'),
+        ('units', 'UNITS.csv rows'),
+        ('variables', 'VARIABLES.csv rows'),
+        ('alarms', 'ALARMS.csv rows'),
+        ('trends', 'TRENDS.csv rows'),
+        ('iec_equip', 'IEC_EQUIP.csv rows'),
+        ('iec_ports', 'IEC_PORTS.csv rows'),
+        ('iec_xml', 'IEC device XML'),
+    ]
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='export_fragments')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    content = models.TextField(blank=True)
+    device_updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = ['device', 'kind']
+
+    def __str__(self):
+        return f"{self.device_id} - {self.kind}"
+
+    @classmethod
+    def invalidate(cls, model, device_ids):
+        """Drop the fragments rendered from ``model`` rows of ``device_ids``.
+
+        Stale fragments are never served, since their stamp no longer
+        matches; this only frees them early.
+        """
+        kinds = {Variable: 'variables', Alarm: 'alarms', Trend: 'trends'}
+        device_ids = list(device_ids)
+        for start in range(0, len(device_ids), 500):
+            fragments = cls.objects.filter(device_id__in=device_ids[start:start + 500])
+            if model is not Device:
+                fragments = fragments.filter(kind=kinds[model])
+            fragments.delete()
@@ -0,0 +1,164 @@
+"""Tag search over variables, alarms and trends.
+
+On SQLite, migration 0009 mirrors the tag columns of all three tables into
+the FTS5 table ``webapp_tag_search``, and triggers keep it in step with
+every write, bulk and raw SQL ones included. The trigram tokenizer matches
+any substring of at least three characters, so ``A\\phs`` finds
+``MMXU1\\A\\phsA`` without scanning the tables.
+
+Where the migration could not create the index (other backends, or SQLite
+older than 3.34 or built without FTS5) the same searches run as
+case-insensitive LIKE scans, ranked by the column that matched.
+"""
+from functools import lru_cache, reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Alarm, Trend, Variable
+
+
+SEARCH_TABLE = 'webapp_tag_search'
+SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_PAGE_SIZE = 500
+
+# The trigram tokenizer cannot match anything shorter.
+MIN_TERM_LENGTH = 3
+
+# Kind -> (model, rowid offset, fields returned). Search rows are keyed
+# ``id * 3 + offset``, matching the migration's triggers. The fields are the
+# name, tag and detail columns the index mirrors.
+SEARCH_KINDS = {
+    'variable': (Variable, 0, ['item_name', 'tag_name', 'equipment']),
+    'alarm': (Alarm, 1, ['alarm_name', 'alarm_tag', 'equipment']),
+    'trend': (Trend, 2, ['tag_description', 'tag_name', 'item_name']),
+}
+
+# bm25 weights of the tag, name and detail (equipment or item name) columns.
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+@lru_cache(maxsize=None)
+def search_index_available():
+    """Whether migration 0009 created the search index; checked once per process."""
+    return SEARCH_TABLE in connection.introspection.table_names()
+
+
+def search_terms(query):
+    """Return the terms of ``query``, raising ValueError if one is too short to index."""
+    terms = query.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        raise ValueError(f'Search terms need at least {MIN_TERM_LENGTH} characters')
+    return terms
+
+
+def like_match(terms, fields):
+    """Return a Q matching rows with every one of ``terms`` in one of ``fields``."""
+    return reduce(and_, (
+        reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields)) for term in terms
+    ))
+
+
+def match_expression(query):
+    """Return the FTS5 query matching rows that contain every term of ``query``.
+
+    Terms are quoted, so tag punctuation is matched literally. Raises
+    ValueError when a term is too short for the trigram index.
+    """
+    terms = search_terms(query)
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def matching_ids(kind, query):
+    """Return a subquery of the ids of ``kind`` rows matching ``query``, for ``id__in``."""
+    model, offset, fields = SEARCH_KINDS[kind]
+    if not search_index_available():
+        return model.objects.filter(like_match(search_terms(query), fields)).values('id')
+    return RawSQL(
+        f'SELECT rowid / 3 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 3 = %s',
+        [match_expression(query), offset]
+    )
+
+
+def like_rowids(terms, kinds, page, page_size):
+    """Return the search rowids of a page of LIKE matches, plus one to tell if there is a next page.
+
+    Rows are ranked by where every term matched: the tag, then the name,
+    then the detail column, ties by rowid. Each kind fetches every row up to
+    the end of the page, so deep pages cost more than with the index.
+    """
+    end = page * page_size + 1
+    ranked = []
+    for kind in kinds:
+        model, offset, (name, tag, detail) = SEARCH_KINDS[kind]
+        rank = Case(
+            When(like_match(terms, [tag]), then=Value(0)),
+            When(like_match(terms, [name]), then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField()
+        )
+        rows = model.objects.filter(like_match(terms, [name, tag, detail])) \
+            .annotate(rank=rank).order_by('rank', 'id').values_list('rank', 'id')[:end]
+        ranked += [(rank, row_id * 3 + offset) for rank, row_id in rows]
+
+    ranked.sort()
+    return [rowid for rank, rowid in ranked[(page - 1) * page_size:end]]
+
+
+def tag_search(params):
+    """Return the page of ranked tag matches that query ``params`` ask for.
+
+    Takes ``q``, optional ``kind`` values to search, and ``page`` and
+    ``page_size``. Raises ValueError naming the first invalid parameter.
+    """
+    query = params.get('q', '')
+    match = match_expression(query)
+
+    kinds = params.getlist('kind') or list(SEARCH_KINDS)
+    invalid = [kind for kind in kinds if kind not in SEARCH_KINDS]
+    if invalid:
+        raise ValueError(f'Invalid kind: {invalid[0]}')
+
+    try:
+        page = max(1, int(params.get('page', 1)))
+        page_size = max(1, min(int(params.get('page_size', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid page or page_size')
+
+    if search_index_available():
+        offsets = ', '.join(str(SEARCH_KINDS[kind][1]) for kind in kinds)
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 3 IN ({offsets}) '
+                f'ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid LIMIT %s OFFSET %s',
+                [match, page_size + 1, (page - 1) * page_size]
+            )
+            rowids = [rowid for rowid, in cursor.fetchall()]
+    else:
+        rowids = like_rowids(query.split(), kinds, page, page_size)
+
+    next_page = None
+    if len(rowids) > page_size:
+        rowids = rowids[:page_size]
+        next_page = page + 1
+
+    # One query per kind on the page, then back into rank order.
+    rows = {}
+    for kind, (model, offset, fields) in SEARCH_KINDS.items():
+        ids = [rowid // 3 for rowid in rowids if rowid % 3 == offset]
+        for row in model.objects.filter(id__in=ids).values('id', 'device_id', 'device__device_name', *fields):
+            rows[row['id'] * 3 + offset] = {
+                'kind': kind,
+                'id': row['id'],
+                'device_id': row['device_id'],
+                'device_name': row['device__device_name'],
+                **{field: row[field] for field in fields}
+            }
+
+    return {
+        'results': [rows[rowid] for rowid in rowids if rowid in rows],
+        'next_page': next_page
+    }
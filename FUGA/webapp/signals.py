@@ -0,0 +1,34 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Alarm, DataVersion, Device, ExportFragment, Trend, Variable
+
+
+def deleted_with_device(origin):
+    """Whether a delete started from a device, rather than from the row itself."""
+    if isinstance(origin, QuerySet):
+        return origin.model is Device
+    return isinstance(origin, Device)
+
+
+# Bulk writes bypass these signals; the importers do the same themselves.
+@receiver(post_save, sender=Device)
+@receiver(post_save, sender=Variable)
+@receiver(post_save, sender=Alarm)
+@receiver(post_save, sender=Trend)
+@receiver(post_delete, sender=Device)
+@receiver(post_delete, sender=Variable)
+@receiver(post_delete, sender=Alarm)
+@receiver(post_delete, sender=Trend)
+def data_changed(sender, instance, signal, origin=None, created=False, **kwargs):
+    if sender is not Device and deleted_with_device(origin):
+        # The device's own receiver runs once for all of its children, and
+        # their fragments cascade with it.
+        return
+
+    # Only creating or deleting a device changes the device count.
+    DataVersion.bump(devices=sender is Device and (created or signal is post_delete))
+    ExportFragment.invalidate(sender, [instance.pk if sender is Device else instance.device_id])
+    if sender is not Device:
+        Device.touch([instance.device_id])
@@ -1773,6 +1773,66 @@ function updateDeviceCounter() {
     if (counter) counter.textContent = devices.length;
 }
 
+// The server renders the first page of stored devices; the count and
+// further pages are fetched from the device API on demand.
+function storedDeviceItem(device) {
+    const item = document.createElement('div');
+    item.className = 'device-item';
+    item.innerHTML = `
+        <div class="device-name"></div>
+        <div class="device-details">
+            <div class="device-info">
+                <span class="device-protocol"></span>
+                <span class="device-io"></span>
+            </div>
+        </div>
+    `;
+    item.querySelector('.device-name').textContent = device.device_name;
+    item.querySelector('.device-protocol').textContent = device.protocol;
+    item.querySelector('.device-io').textContent = device.device_type;
+    return item;
+}
+
+function loadStoredDeviceCount() {
+    const counter = document.getElementById('storedDeviceCounter');
+    if (!counter) return;
+
+    fetch(counter.dataset.url)
+        .then(response => response.json())
+        .then(data => {
+            counter.textContent = data.success ? data.count : '?';
+        })
+        .catch(() => {
+            counter.textContent = '?';
+        });
+}
+
+function loadMoreStoredDevices() {
+    const list = document.getElementById('storedDeviceList');
+    const button = document.getElementById('loadMoreDevices');
+    if (!list || !list.dataset.nextCursor) return;
+
+    button.disabled = true;
+    fetch(`${list.dataset.url}?cursor=${encodeURIComponent(list.dataset.nextCursor)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.error);
+            data.devices.forEach(device => list.appendChild(storedDeviceItem(device)));
+            list.dataset.nextCursor = data.next_cursor || '';
+            button.hidden = !data.next_cursor;
+        })
+        .catch(error => showAlert(`Could not load devices: ${error.message}`, 'error'))
+        .finally(() => {
+            button.disabled = false;
+        });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    loadStoredDeviceCount();
+    const button = document.getElementById('loadMoreDevices');
+    if (button) button.addEventListener('click', loadMoreStoredDevices);
+});
+
 function generateCSV() {
     if (devices.length === 0) {
         showAlert('No devices to export. Please save at least one device first.', 'error');
@@ -1,3 +1,1374 @@
-from django.test import TestCase
+import csv
+import base64
+import importlib
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import json
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.contrib import admin
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from .exporters import FRAGMENTS, csv_export_chunks, gunzip_chunks
+from .devices import DEVICE_PAGE_SIZE, delete_devices, encode_cursor, raw_delete, render_device_document
+from . import jobs
+from .iec_xml import render_document
+from .importers import PREVIEW_TTL, DeviceResolver, bulk_upsert, bundle_result, iter_decoded_lines
+from .models import Alarm, DataVersion, Device, ExportFragment, ImportJob, Trend, Variable
+from .search import SEARCH_KINDS, SEARCH_TABLE, match_expression
+
+
+VARIABLE_FIELDS = ['io_device', 'tag_name', 'address', 'equipment', 'data_type']
+
+# Tests get private caches instead of the shared file caches.
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ['default', 'exports']
+}
+
+
+def create_device(device_name='DEV_1', **fields):
+    return Device.objects.create(**{
+        'device_name': device_name,
+        'device_type': 'PV',
+        'tag_prefix': 'P1',
+        'io_device': f'IO_{device_name}',
+        'protocol': 'modbus',
+        'modbus_variant': 'tcp',
+        'device_ip': '10.0.0.1',
+        **fields
+    })
+
+
+def variable_values(tag_name, **fields):
+    return {'io_device': 'IO', 'tag_name': tag_name, 'address': '1', 'equipment': 'EQ', 'data_type': 'float', **fields}
+
+
+def indexed(query):
+    # Reads the search index itself; tag_search would hide rows left behind
+    # for deleted children.
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match_expression(query)])
+        return {rowid for rowid, in cursor.fetchall()}
+
+
+def search_rowid(kind, row):
+    return row.id * 3 + SEARCH_KINDS[kind][1]
+
+
+@override_settings(CACHES=TEST_CACHES)
+class WebappTestCase(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+
+class BulkUpsertTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.devices = [create_device(f'DEV_{index}') for index in range(3)]
+
+    def records(self, count, **fields):
+        # Spread over several devices, so lookups cover more pairs than
+        # fit in one statement.
+        return {
+            (self.devices[index % 3].id, f'V{index}'): variable_values(f'TAG_{index}', **fields)
+            for index in range(count)
+        }
+
+    def test_counts_created_updated_and_unchanged(self):
+        counts = bulk_upsert(Variable, 'item_name', self.records(1200), VARIABLE_FIELDS)
+        self.assertEqual(counts['created'], 1200)
+        self.assertEqual(Variable.objects.count(), 1200)
+
+        records = self.records(1200)
+        for key in list(records)[:700]:
+            records[key] = {**records[key], 'equipment': 'CHANGED'}
+        counts = bulk_upsert(Variable, 'item_name', records, VARIABLE_FIELDS)
+        self.assertEqual((counts['created'], counts['updated'], counts['unchanged']), (0, 700, 500))
+        self.assertEqual(Variable.objects.filter(equipment='CHANGED').count(), 700)
+        self.assertEqual(Variable.objects.count(), 1200)
+
+    def test_dry_run_writes_nothing(self):
+        version = DataVersion.current()
+        counts = bulk_upsert(Variable, 'item_name', self.records(10), VARIABLE_FIELDS, dry_run=True)
+        self.assertEqual(counts['created'], 10)
+        self.assertFalse(Variable.objects.exists())
+        self.assertEqual(DataVersion.current(), version)
+
+    def test_keeps_primary_keys_of_updated_rows(self):
+        bulk_upsert(Variable, 'item_name', self.records(5), VARIABLE_FIELDS)
+        ids = dict(Variable.objects.values_list('item_name', 'id'))
+        bulk_upsert(Variable, 'item_name', self.records(5, address='2'), VARIABLE_FIELDS)
+        self.assertEqual(dict(Variable.objects.values_list('item_name', 'id')), ids)
+
+
+class DecodedLinesTests(WebappTestCase):
+
+    def lines(self, content, chunk_size=File.DEFAULT_CHUNK_SIZE):
+        with mock.patch.object(File, 'DEFAULT_CHUNK_SIZE', chunk_size):
+            return list(iter_decoded_lines(File(io.BytesIO(content))))
+
+    def test_latin1_is_detected_past_the_first_chunk(self):
+        content = b'A;B\n' * 20000 + 'Caf\xe9\n'.encode('iso-8859-1')
+        self.assertGreater(len(content), File.DEFAULT_CHUNK_SIZE)
+        self.assertEqual(self.lines(content)[-1], 'Caf\xe9\n')
+
+    def test_crlf_split_across_chunks_is_one_line_break(self):
+        self.assertEqual(self.lines(b'AB\r\nCD\r\n', chunk_size=3), ['AB\r\n', 'CD\r\n'])
+
+    def test_multibyte_character_split_across_chunks(self):
+        content = 'Caf\xe9;\u2103\n'.encode('utf-8')
+        for chunk_size in range(1, len(content)):
+            self.assertEqual(self.lines(content, chunk_size), ['Caf\xe9;\u2103\n'])
+
+    def test_csv_rows_keep_their_line_breaks(self):
+        rows = list(csv.reader(self.lines(b'A;"x\r\ny"\r\nB;z', chunk_size=4), delimiter=';'))
+        self.assertEqual(rows, [['A', 'x\r\ny'], ['B', 'z']])
+
+
+class DeviceResolverTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.older = create_device('DEV_A', tag_prefix='P1')
+        self.newer = create_device('DEV_B', tag_prefix='P1')
+        Device.objects.filter(pk=self.older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        # The older device's variable is the older row; device age decides, not row ids.
+        for device in [self.older, self.newer]:
+            Variable.objects.create(device=device, item_name='SHARED', **variable_values('TAG'))
+
+    def test_newest_device_wins_a_shared_item_name(self):
+        resolver = DeviceResolver()
+        resolver.load_item_names(['SHARED', 'MISSING'])
+        self.assertEqual(resolver.resolve('SHARED'), self.newer.id)
+        self.assertIsNone(resolver.resolve('MISSING'))
+
+    def test_newest_device_wins_a_shared_prefix(self):
+        self.assertEqual(DeviceResolver().resolve('MISSING', tag_name='P1_TAG'), self.newer.id)
+
+    def test_equipment_column_comes_first(self):
+        resolver = DeviceResolver()
+        resolver.load_item_names(['SHARED'])
+        self.assertEqual(resolver.resolve('SHARED', 'P1_TAG', device_name='DEV_A'), self.older.id)
+
+
+class EquipmentImportTests(WebappTestCase):
+
+    EQUIPMENT = (
+        'ITEM_NAME;EQUIP_TYPE;COMMENT;CUSTOM01;CUSTOM02;PROTOCOL;IP_ADDRESS;PORT\n'
+        'DEV_1;PV;PV - DEV_1;P1;IO_1;MODBUS;10.0.0.1;502\n'
+        'DEV_2;BESS;BESS - DEV_2;B2;IO_2;MODBUS;10.0.0.2;5020\n'
+        'DEV_3;PV;PV - DEV_3;R3;IO_3;MODBUS;10.0.0.3;502\n'
+    )
+
+    def upload(self, content, **data):
+        response = self.client.post('/api/csv/upload/', {
+            'file': SimpleUploadedFile('EQUIP.csv', content.encode()), 'type': 'equipment', **data
+        })
+        result = response.json()
+        self.assertTrue(result['success'], result)
+        return result
+
+    def test_reimporting_the_same_file_writes_nothing(self):
+        self.assertEqual(self.upload(self.EQUIPMENT)['created'], 3)
+        stored = list(Device.objects.order_by('id').values())
+        version = DataVersion.current()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.upload(self.EQUIPMENT)
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 3))
+        writes = [query['sql'] for query in queries if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertEqual(list(Device.objects.order_by('id').values()), stored)
+        self.assertEqual(DataVersion.current(), version)
+
+    def test_changing_one_field_updates_one_device(self):
+        self.upload(self.EQUIPMENT)
+        for old, new in [('10.0.0.2', '10.0.0.20'), ('R3', 'R4'), ('5020', '5021')]:
+            with self.subTest(new):
+                self.upload(self.EQUIPMENT)
+                content = self.EQUIPMENT.replace(old, new)
+                result = self.upload(content)
+                self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 1, 2))
+                self.assertEqual(self.upload(content)['unchanged'], 3)
+
+        # The comment column is not stored, so it changes nothing.
+        self.upload(self.EQUIPMENT)
+        result = self.upload(self.EQUIPMENT.replace('PV - DEV_1', 'Inverter bay 1'))
+        self.assertEqual((result['updated'], result['unchanged']), (0, 3))
+
+    def test_dry_run_reports_without_writing(self):
+        self.upload(self.EQUIPMENT)
+        content = self.EQUIPMENT.replace('10.0.0.2', '10.0.0.20') + 'DEV_4;PV;PV - DEV_4;P4;IO_4;MODBUS;10.0.0.4;502\n'
+        result = self.upload(content, dry_run='1')
+        self.assertEqual((result['inserts'], result['updates'], result['unchanged']), (1, 1, 2))
+        self.assertEqual(Device.objects.count(), 3)
+        self.assertEqual(Device.objects.get(device_name='DEV_2').device_ip, '10.0.0.2')
+
+
+class BundleImportTests(WebappTestCase):
+
+    def bundle(self, members):
+        content = io.BytesIO()
+        with zipfile.ZipFile(content, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for name, text in members.items():
+                bundle.writestr(f'project/{name}', text)
+        content.seek(0)
+        return content
+
+    def test_applies_members_in_dependency_order(self):
+        device = create_device('DEV_1')
+        Variable.objects.create(device=device, item_name='V1', **variable_values('TAG_1', equipment='DEV_1'))
+        members = {
+            name: ''.join(csv_export_chunks(csv_type, {})[1])
+            for csv_type, name in [('variables', 'VARIABLES.csv'), ('equipment', 'EQUIP.csv')]
+        }
+        device.delete()
+
+        # Variables come first in the zip but need the device EQUIP.csv creates.
+        result = bundle_result(self.bundle(members))
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['results']['variables']['created'], 1)
+        self.assertEqual(Variable.objects.get().device.device_name, 'DEV_1')
+
+    def test_rejects_oversized_members_before_reading(self):
+        with mock.patch('webapp.importers.BUNDLE_MEMBER_MAX_BYTES', 1024):
+            result = bundle_result(self.bundle({'EQUIP.csv': 'ITEM_NAME\n' + 'x' * 2048}))
+        self.assertFalse(result['success'])
+        self.assertIn('EQUIP.csv is larger than', result['error'])
+        self.assertFalse(Device.objects.exists())
+
+
+class AlarmImportTests(WebappTestCase):
+
+    HEADER = 'Alarm Name;Equipment;Item Name;Data Type\n'
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+
+    def upload(self, rows, **data):
+        content = (self.HEADER + ''.join(rows)).encode()
+        response = self.client.post('/api/csv/upload/', {
+            'file': SimpleUploadedFile('ALARMS.csv', content), 'type': 'alarms', **data
+        })
+        return response.json()
+
+    def alarm_rows(self, count):
+        return [f'ALARM_{index};DEV_1;ITEM_{index};DIGITAL\n' for index in range(count)]
+
+    def test_preview_is_stored_and_paginated(self):
+        result = self.upload(self.alarm_rows(250))
+        self.assertTrue(result['success'], result)
+        self.assertEqual((result['count'], result['num_pages'], len(result['alarms'])), (250, 3, 100))
+        self.assertFalse(Alarm.objects.exists())
+
+        page = self.client.get(f'/api/alarms/preview/{result["import_id"]}/', {'page': 3}).json()
+        self.assertEqual((page['page'], len(page['alarms'])), (3, 50))
+        self.assertEqual(page['alarms'][0]['alarm_name'], 'ALARM_200')
+        self.assertEqual(page['alarms'][0]['alarm_type'], 'digital')
+
+        page = self.client.get(f'/api/alarms/preview/{result["import_id"]}/', {'page_size': 'x'})
+        self.assertEqual(page.status_code, 400)
+
+    def test_preview_endpoint_only_serves_previews(self):
+        job = ImportJob.objects.create(kind='alarms', status='done', options={'mode': 'preview'})
+        self.assertEqual(self.client.get(f'/api/alarms/preview/{job.id}/').status_code, 404)
+
+    def test_expired_previews_are_pruned_but_import_jobs_kept(self):
+        expired = timezone.now() - PREVIEW_TTL * 2
+        old_preview = self.upload(self.alarm_rows(1))['import_id']
+        job = ImportJob.objects.create(kind='alarms', status='done', options={'mode': 'preview'})
+        ImportJob.objects.update(created_at=expired)
+
+        new_preview = self.upload(self.alarm_rows(1))['import_id']
+        self.assertEqual(set(ImportJob.objects.values_list('id', flat=True)), {job.id, new_preview})
+        self.assertNotEqual(old_preview, new_preview)
+
+    def test_import_mode_writes_alarms_and_reports_skipped_rows(self):
+        rows = self.alarm_rows(3) + [
+            ';DEV_1;;DIGITAL\n',  # no alarm or item name
+            'ALARM_X;NO_SUCH_DEVICE;NO_SUCH_ITEM;DIGITAL\n',  # no device to attach to
+        ]
+        result = self.upload(rows, mode='import')
+        self.assertTrue(result['success'], result)
+        self.assertEqual((result['created'], result['skipped']), (3, 2))
+        self.assertEqual(set(self.device.alarms.values_list('alarm_name', flat=True)), {'ALARM_0', 'ALARM_1', 'ALARM_2'})
+
+        result = self.upload(rows, mode='import')
+        self.assertEqual((result['created'], result['unchanged'], result['skipped']), (0, 3, 2))
+
+
+class DataVersionTests(WebappTestCase):
+
+    def test_rolled_back_versions_are_not_reused(self):
+        DataVersion.bump()
+        with transaction.atomic():
+            DataVersion.bump()
+            rolled_back = DataVersion.current()
+            transaction.set_rollback(True)
+
+        DataVersion.bump()
+        self.assertNotEqual(DataVersion.current(), rolled_back)
+
+    def test_exports_are_not_served_from_a_rolled_back_version(self):
+        create_device('DEV_1')
+        with transaction.atomic():
+            create_device('DEV_2')
+            self.assertIn(b'DEV_2', b''.join(self.client.get('/api/csv/generate/', {'type': 'equipment'})))
+            transaction.set_rollback(True)
+
+        create_device('DEV_3')
+        body = b''.join(self.client.get('/api/csv/generate/', {'type': 'equipment'}))
+        self.assertIn(b'DEV_3', body)
+        self.assertNotIn(b'DEV_2', body)
+
+
+class DeviceCountTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        self.assertEqual(Device.cached_count(), 1)
+
+    def assertCountCached(self):
+        with CaptureQueriesContext(connection) as queries:
+            count = Device.cached_count()
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        return count
+
+    def test_count_follows_the_device_token(self):
+        # Raw deletes send no signals; the token alone moves the count on.
+        raw_delete(Device.objects.filter(device_name='DEV_1'))
+        self.assertEqual(self.assertCountCached(), 1)
+        DataVersion.bump(devices=True)
+        self.assertEqual(Device.cached_count(), 0)
+
+    def test_child_and_device_updates_keep_the_count_cached(self):
+        Variable.objects.create(device=self.device, item_name='V1', **variable_values('TAG_1'))
+        bulk_upsert(Variable, 'item_name', {(self.device.id, 'V2'): variable_values('TAG_2')}, VARIABLE_FIELDS)
+        self.device.device_type = 'BESS'
+        self.device.save()
+        self.assertEqual(self.assertCountCached(), 1)
+
+    def test_device_creates_and_deletes_move_the_count_on(self):
+        create_device('DEV_2')
+        self.assertEqual(Device.cached_count(), 2)
+
+        self.client.post('/api/devices/bulk-save/', json.dumps([{
+            'device_name': 'DEV_3', 'device_type': 'PV', 'tag_prefix': 'P3', 'io_device': 'IO_3', 'protocol': 'modbus',
+            'modbus_variant': 'tcp', 'device_ip': '10.0.0.3'
+        }]), content_type='application/json')
+        self.assertEqual(Device.cached_count(), 3)
+
+        equipment = ''.join(csv_export_chunks('equipment', {})[1]).replace('DEV_3', 'DEV_4')
+        result = self.client.post('/api/csv/upload/', {
+            'file': SimpleUploadedFile('EQUIP.csv', equipment.encode()), 'type': 'equipment'
+        }).json()
+        self.assertEqual(result['created'], 1, result)
+        self.assertEqual(Device.cached_count(), 4)
+
+        delete_devices(Device.objects.filter(device_name='DEV_4'))
+        self.assertEqual(Device.cached_count(), 3)
+        Device.objects.get(device_name='DEV_3').delete()
+        self.assertEqual(self.client.get('/api/devices/count/').json()['count'], 2)
+
+    def test_count_from_a_rolled_back_write_is_not_served(self):
+        with transaction.atomic():
+            create_device('DEV_2')
+            self.assertEqual(Device.cached_count(), 2)
+            transaction.set_rollback(True)
+
+        self.assertEqual(Device.cached_count(), 1)
+
+
+class IndexPageTests(WebappTestCase):
+
+    def test_renders_the_first_page_and_follows_on_through_the_api(self):
+        Device.objects.bulk_create([
+            Device(device_name=f'DEV_{index:03}', device_type='PV', tag_prefix='P', io_device='IO', protocol='modbus')
+            for index in range(DEVICE_PAGE_SIZE + 1)
+        ])
+        response = self.client.get('/index/')
+        rendered = response.context['devices']
+        self.assertEqual(len(rendered), DEVICE_PAGE_SIZE)
+        self.assertContains(response, f'data-next-cursor="{response.context["next_cursor"]}"')
+        self.assertContains(response, f'<div class="device-name">{rendered[0]["device_name"]}</div>')
+
+        page = self.client.get('/api/devices/', {'cursor': response.context['next_cursor']}).json()
+        shown = [device['device_name'] for device in rendered] + [device['device_name'] for device in page['devices']]
+        self.assertEqual(sorted(shown), sorted(Device.objects.values_list('device_name', flat=True)))
+        self.assertIsNone(page['next_cursor'])
+
+    def test_empty_fleet(self):
+        response = self.client.get('/index/')
+        self.assertContains(response, 'No devices stored yet.')
+        self.assertContains(response, 'data-next-cursor=""')
+
+
+class DeleteSignalTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        Variable.objects.bulk_create([
+            Variable(device=self.device, item_name=f'V{index}', **variable_values(f'TAG_{index}'))
+            for index in range(2000)
+        ])
+
+    def version(self):
+        return DataVersion.objects.get().version
+
+    def test_device_delete_runs_the_receivers_once(self):
+        DataVersion.bump()
+        version = self.version()
+        with CaptureQueriesContext(connection) as queries:
+            self.device.delete()
+        # Per-child receivers would run thousands of queries.
+        self.assertLess(len(queries), 50)
+        self.assertEqual(self.version(), version + 1)
+        self.assertFalse(Variable.objects.exists())
+
+    def test_child_delete_still_bumps_the_version(self):
+        DataVersion.bump()
+        version = self.version()
+        Variable.objects.get(item_name='V1').delete()
+        self.assertEqual(self.version(), version + 1)
+
+    def test_admin_deletes_through_delete_devices(self):
+        model_admin = admin.site._registry[Device]
+        with mock.patch('webapp.admin.delete_devices', wraps=delete_devices) as delete:
+            model_admin.delete_queryset(None, Device.objects.all())
+        delete.assert_called_once()
+        self.assertFalse(Device.objects.exists())
+        self.assertFalse(Variable.objects.exists())
+
+
+class ExportFragmentTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        self.variable = Variable.objects.create(
+            device=self.device, item_name='V1', **variable_values('OLD_TAG', equipment='DEV_1')
+        )
+
+    def export(self):
+        return ''.join(csv_export_chunks('variables', {})[1])
+
+    def test_unchanged_fragments_are_reused(self):
+        source, dialect = FRAGMENTS['variables']
+        rendered = []
+
+        def counting_source(device_ids):
+            rendered.extend(device_ids)
+            return source(device_ids)
+
+        with mock.patch.dict(FRAGMENTS, {'variables': (counting_source, dialect)}):
+            first = self.export()
+            second = self.export()
+        self.assertEqual(first, second)
+        self.assertEqual(rendered, [self.device.id])
+
+    def test_write_between_render_and_store_is_not_served(self):
+        source, dialect = FRAGMENTS['variables']
+
+        def racing_source(device_ids):
+            rows = list(source(device_ids))
+            # Commits after the rows were read, before the fragment is stored.
+            self.variable.tag_name = 'NEW_TAG'
+            self.variable.save()
+            return rows
+
+        with mock.patch.dict(FRAGMENTS, {'variables': (racing_source, dialect)}):
+            self.assertIn('OLD_TAG', self.export())
+
+        export = self.export()
+        self.assertIn('NEW_TAG', export)
+        self.assertNotIn('OLD_TAG', export)
+
+
+class SaveDeviceTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        self.save({
+            'variables': [
+                {'item_name': 'V1', 'tag_name': 'MMXU1\\A\\phsA', 'equipment': 'DEV_1'},
+                {'item_name': 'V2', 'tag_name': 'MMXU1\\A\\phsB', 'equipment': 'DEV_1'},
+            ],
+            'alarms': [{'alarm_name': 'A1', 'alarm_tag': 'TRIP'}],
+            'trends': [{'tag_description': 'T1', 'tag_name': 'MMXU1\\A\\phsA'}],
+        })
+
+    def save(self, children, status=200):
+        document = {
+            'id': self.device.id,
+            'device_name': 'DEV_1',
+            'device_type': 'PV',
+            'tag_prefix': 'P1',
+            'io_device': 'IO_DEV_1',
+            'protocol': 'modbus',
+            'modbus_variant': 'tcp',
+            'device_ip': '10.0.0.1',
+            **children
+        }
+        response = self.client.post('/api/device/save/', json.dumps(document), content_type='application/json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def variables(self):
+        return dict(self.device.variables.values_list('item_name', 'tag_name'))
+
+    def test_inserts_updates_and_deletes_children(self):
+        self.save({'variables': [
+            {'item_name': 'V1', 'tag_name': 'CHANGED', 'equipment': 'DEV_1'},
+            {'item_name': 'V3', 'tag_name': 'ADDED', 'equipment': 'DEV_1'},
+        ]})
+        self.assertEqual(self.variables(), {'V1': 'CHANGED', 'V3': 'ADDED'})
+        # Lists that are not posted are left alone.
+        self.assertEqual(list(self.device.alarms.values_list('alarm_name', flat=True)), ['A1'])
+
+        self.save({'alarms': [], 'trends': []})
+        self.assertFalse(Alarm.objects.exists())
+        self.assertFalse(Trend.objects.exists())
+
+    def test_keeps_primary_keys_of_unchanged_and_updated_rows(self):
+        ids = dict(self.device.variables.values_list('item_name', 'id'))
+        self.save({'variables': [
+            {'item_name': 'V1', 'tag_name': 'MMXU1\\A\\phsA', 'equipment': 'DEV_1'},
+            {'item_name': 'V2', 'tag_name': 'CHANGED', 'equipment': 'DEV_1'},
+        ]})
+        self.assertEqual(dict(self.device.variables.values_list('item_name', 'id')), ids)
+
+    def test_duplicate_natural_keys_are_rejected_without_writing(self):
+        before = self.variables()
+        result = self.save({
+            'device_type': 'BESS',
+            'variables': [{'item_name': 'V9', 'tag_name': 'X'}, {'item_name': 'V9', 'tag_name': 'Y'}],
+        }, status=400)
+        self.assertIn('Duplicate item_name: V9', result['error'])
+        self.assertEqual(self.variables(), before)
+        self.assertEqual(Device.objects.get().device_type, 'PV')
+
+    def test_updates_the_search_index(self):
+        v1, v2 = Variable.objects.order_by('item_name')
+        trend = Trend.objects.get()
+        self.assertEqual(
+            indexed('phsA'),
+            {search_rowid('variable', v1), search_rowid('trend', trend)}
+        )
+        self.assertEqual(indexed('phsB'), {search_rowid('variable', v2)})
+
+        self.save({'variables': [{'item_name': 'V1', 'tag_name': 'MMXU2\\Hz', 'equipment': 'DEV_1'}]})
+        # Trends were not posted, so theirs is still indexed.
+        self.assertEqual(indexed('phsA'), {search_rowid('trend', trend)})
+        self.assertEqual(indexed('phsB'), set())
+        self.assertEqual(indexed('MMXU2'), {search_rowid('variable', v1)})
+
+    def export(self, csv_type):
+        return ''.join(csv_export_chunks(csv_type, {})[1])
+
+    def test_invalidates_export_fragments(self):
+        self.assertIn('phsB', self.export('variables'))
+        self.assertIn('TRIP', self.export('alarms'))
+        self.assertEqual(ExportFragment.objects.filter(device=self.device).count(), 2)
+
+        self.save({'variables': [{'item_name': 'V1', 'tag_name': 'MMXU2\\Hz', 'equipment': 'DEV_1'}]})
+        self.assertFalse(ExportFragment.objects.filter(device=self.device, kind='variables').exists())
+        export = self.export('variables')
+        self.assertIn('MMXU2\\Hz', export)
+        self.assertNotIn('phsB', export)
+
+
+class DeleteDevicesTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.devices = [create_device(f'DEV_{index}') for index in range(2)]
+        for device in self.devices:
+            Variable.objects.create(device=device, item_name='V1', **variable_values(f'{device.device_name}\\phsA'))
+            Alarm.objects.create(device=device, alarm_name='A1', alarm_tag=f'{device.device_name}\\TRIP')
+            Trend.objects.create(device=device, tag_description='T1', tag_name=f'{device.device_name}\\Hz')
+        for csv_type in ['variables', 'alarms', 'trends']:
+            ''.join(csv_export_chunks(csv_type, {})[1])
+
+    def test_deletes_children_fragments_and_search_rows(self):
+        deleted, kept = self.devices
+        counts = delete_devices(Device.objects.filter(id=deleted.id))
+        self.assertEqual(counts['devices'], 1)
+        self.assertEqual((counts['variables'], counts['alarms'], counts['trends'], counts['export_fragments']), (1, 1, 1, 3))
+
+        self.assertEqual(list(Device.objects.all()), [kept])
+        for model in [Variable, Alarm, Trend, ExportFragment]:
+            self.assertEqual(set(model.objects.values_list('device_id', flat=True)), {kept.id})
+        self.assertEqual(indexed('DEV_0'), set())
+        self.assertEqual(indexed('DEV_1'), {
+            search_rowid('variable', kept.variables.get()),
+            search_rowid('alarm', kept.alarms.get()),
+            search_rowid('trend', kept.trends.get()),
+        })
+
+    def test_bumps_data_version_and_device_count(self):
+        self.assertEqual(Device.cached_count(), 2)
+        version = DataVersion.current()
+
+        delete_devices(Device.objects.filter(id=self.devices[0].id))
+        self.assertNotEqual(DataVersion.current(), version)
+        self.assertEqual(Device.cached_count(), 1)
+        self.assertNotIn('DEV_0', ''.join(csv_export_chunks('variables', {})[1]))
+
+    def test_deleting_nothing_changes_nothing(self):
+        version = DataVersion.current()
+        counts = delete_devices(Device.objects.none())
+        self.assertEqual(counts['devices'], 0)
+        self.assertEqual(DataVersion.current(), version)
+        self.assertEqual(Variable.objects.count(), 2)
+
+
+class ImportJobTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        for patcher in [
+            override_settings(MEDIA_ROOT=media_root),
+            mock.patch.object(jobs, 'IMPORT_LOCK_FILE', os.path.join(media_root, 'imports', '.lock')),
+            mock.patch.object(jobs, 'executor'),
+        ]:
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+
+        self.device = create_device('DEV_1')
+        Variable.objects.create(device=self.device, item_name='V1', **variable_values('TAG_1', equipment='DEV_1'))
+        self.csv = ''.join(csv_export_chunks('variables', {})[1]).encode()
+        Variable.objects.all().delete()
+
+    def enqueue(self, name='VARIABLES.csv', content=None):
+        upload = SimpleUploadedFile(name, self.csv if content is None else content)
+        with self.captureOnCommitCallbacks(execute=True):
+            return jobs.enqueue_import('variables', upload, dry_run=False)
+
+    def test_enqueue_stores_the_upload_and_wakes_the_worker(self):
+        job = self.enqueue()
+        self.assertEqual(ImportJob.objects.get().status, 'pending')
+        self.assertTrue(job.upload.storage.exists(job.upload.name))
+        jobs.executor.submit.assert_called_once_with(jobs.work)
+
+    def test_resume_wakes_the_worker(self):
+        jobs.resume_import_jobs()
+        jobs.executor.submit.assert_called_once_with(jobs.work)
+
+    def test_pending_jobs_run_oldest_first(self):
+        first = self.enqueue()
+        second = self.enqueue(content=b'garbage')
+        upload = first.upload.name
+
+        order = []
+        with mock.patch.object(jobs, 'run_import_job', wraps=jobs.run_import_job) as run:
+            run.side_effect = lambda job: order.append(job.pk) or mock.DEFAULT
+            jobs.run_pending_jobs()
+        self.assertEqual(order, [first.pk, second.pk])
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'done')
+        self.assertEqual(first.rows_processed, 1)
+        self.assertFalse(first.upload)
+        self.assertFalse(first.upload.storage.exists(upload))
+        self.assertEqual(Variable.objects.get().item_name, 'V1')
+        self.assertEqual(ImportJob.objects.get(pk=second.pk).status, 'failed')
+
+    def test_jobs_interrupted_by_a_restart_are_failed(self):
+        interrupted = self.enqueue()
+        ImportJob.objects.filter(pk=interrupted.pk).update(status='running')
+        upload = interrupted.upload.name
+        pending = self.enqueue()
+
+        jobs.run_pending_jobs()
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, 'failed')
+        self.assertEqual(interrupted.errors, ['Interrupted by a server restart'])
+        self.assertFalse(interrupted.upload.storage.exists(upload))
+        self.assertEqual(ImportJob.objects.get(pk=pending.pk).status, 'done')
+
+    def test_failures_outside_the_import_do_not_stall_the_queue(self):
+        broken = self.enqueue()
+        pending = self.enqueue()
+
+        with mock.patch.object(jobs, 'finish_job', wraps=jobs.finish_job) as finish, \
+                self.assertLogs('webapp.jobs', 'ERROR') as logs:
+            finish.side_effect = [OperationalError('database is locked'), mock.DEFAULT]
+            jobs.run_pending_jobs()
+        self.assertIn(f'Import job {broken.pk} failed', logs.output[0])
+
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.errors), ('failed', ['database is locked']))
+        self.assertEqual(ImportJob.objects.get(pk=pending.pk).status, 'done')
+
+    def test_progress_is_shared_through_the_cache(self):
+        job = self.enqueue()
+        with mock.patch.object(jobs.cache, 'set', wraps=jobs.cache.set) as cache_set:
+            jobs.run_pending_jobs()
+        reported = [call.args[:2] for call in cache_set.call_args_list]
+        self.assertIn((jobs.PROGRESS_KEY.format(job.pk), 1), reported)
+        self.assertIsNone(jobs.cache.get(jobs.PROGRESS_KEY.format(job.pk)))
+
+        job.refresh_from_db()
+        job.status = 'running'
+        jobs.cache.set(jobs.PROGRESS_KEY.format(job.pk), 42)
+        self.assertEqual(jobs.describe_job(job)['rows_processed'], 42)
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.json()['job']['status'], 'done')
+
+
+class DevicePageTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.devices = [create_device(f'DEV_{index}') for index in range(5)]
+        # Two devices share a timestamp with each other, three with another.
+        now = timezone.now()
+        Device.objects.filter(id__in=[device.id for device in self.devices[:2]]).update(created_at=now)
+        Device.objects.filter(id__in=[device.id for device in self.devices[2:]]).update(
+            created_at=now - timedelta(hours=1)
+        )
+
+    def page(self, status=200, **params):
+        response = self.client.get('/api/devices/', params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def all_pages(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            page = self.page(**params, **({'cursor': cursor} if cursor else {}))
+            ids += [device['id'] for device in page['devices']]
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_are_stable_across_equal_timestamps(self):
+        expected = [device.id for device in self.devices[:2]] + [device.id for device in self.devices[2:]]
+        for page_size in range(1, 7):
+            ids, pages = self.all_pages(page_size=page_size)
+            self.assertEqual(ids, expected, page_size)
+            self.assertEqual(pages, max(1, -(-len(expected) // page_size)), page_size)
+
+    def test_last_page_has_no_cursor(self):
+        first = self.page(page_size=3)
+        self.assertIsNotNone(first['next_cursor'])
+        last = self.page(page_size=3, cursor=first['next_cursor'])
+        self.assertEqual(len(last['devices']), 2)
+        self.assertIsNone(last['next_cursor'])
+        # A page that ends exactly on the last device has no cursor either.
+        self.assertIsNone(self.page(page_size=5)['next_cursor'])
+
+    def test_garbage_and_tampered_cursors_are_rejected(self):
+        encoded = [b'no separator', b'not a date|1', b'2026-13-45T00:00:00|1', b'2026-01-01T00:00:00|one']
+        for cursor in ['garbage!!', '\xe9', *(base64.urlsafe_b64encode(value).decode() for value in encoded)]:
+            self.assertEqual(self.page(status=400, cursor=cursor)['error'], 'Invalid cursor', cursor)
+
+    def test_cursor_round_trip(self):
+        device = self.devices[2]
+        device.refresh_from_db()
+        page = self.page(cursor=encode_cursor(device.created_at, device.id))
+        self.assertEqual([row['id'] for row in page['devices']], [self.devices[3].id, self.devices[4].id])
+
+    def test_fields_are_whitelisted(self):
+        page = self.page(fields='device_ip, device_name', page_size=1)
+        self.assertEqual(list(page['devices'][0]), ['id', 'device_ip', 'device_name'])
+        self.assertEqual(page['devices'][0]['device_ip'], '10.0.0.1')
+
+        self.assertEqual(
+            list(self.page(page_size=1)['devices'][0]), ['id', 'device_name', 'device_type', 'protocol', 'created_at']
+        )
+        self.assertEqual(self.page(status=400, fields='device_name,password')['error'], 'Invalid fields: password')
+        self.assertEqual(self.page(status=400, fields='variables')['error'], 'Invalid fields: variables')
+        self.assertEqual(self.page(status=400, page_size='x')['error'], 'Invalid page_size')
+
+
+class DeviceDocumentTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        self.variable = Variable.objects.create(
+            device=self.device, item_name='V1', **variable_values('TAG_1', equipment='DEV_1')
+        )
+        self.url = f'/api/device/{self.device.id}/'
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def assertETagChanges(self, write):
+        etag = self.get()['ETag']
+        write()
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.content, render_device_document(self.device.id))
+
+    def test_body_matches_the_uncached_render(self):
+        expected = render_device_document(self.device.id)
+        self.assertEqual(self.get().content, expected)
+        # The second request is served from the cached gzip body.
+        self.assertEqual(self.get().content, expected)
+
+        response = self.get(accept_encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), expected)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+        weak = self.get(accept_encoding='gzip')['ETag']
+        self.assertEqual(weak, 'W/' + etag)
+        self.assertEqual(self.get(if_none_match=weak, accept_encoding='gzip').status_code, 304)
+
+    def test_child_writes_change_the_etag(self):
+        def save_variable():
+            self.variable.tag_name = 'TAG_2'
+            self.variable.save()
+
+        def save_device():
+            self.client.post('/api/device/save/', json.dumps({
+                'id': self.device.id, 'device_name': 'DEV_1', 'device_type': 'PV', 'tag_prefix': 'P1',
+                'io_device': 'IO_DEV_1', 'protocol': 'modbus', 'modbus_variant': 'tcp', 'device_ip': '10.0.0.1',
+                'alarms': [{'alarm_name': 'A1', 'alarm_tag': 'TRIP'}],
+            }), content_type='application/json')
+
+        def import_trends():
+            bulk_upsert(Trend, 'tag_description', {(self.device.id, 'T1'): {'tag_name': 'TAG_1'}}, ['tag_name'])
+
+        def delete_alarm():
+            Alarm.objects.get().delete()
+
+        for write in [save_variable, save_device, import_trends, delete_alarm]:
+            with self.subTest(write.__name__):
+                self.assertETagChanges(write)
+
+    def test_missing_device_is_not_found(self):
+        self.assertEqual(self.client.get('/api/device/999999/').status_code, 404)
+
+
+class BulkSaveTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+
+    def document(self, device_name, **fields):
+        return {
+            'device_name': device_name,
+            'device_type': 'PV',
+            'tag_prefix': 'P1',
+            'io_device': f'IO_{device_name}',
+            'protocol': 'modbus',
+            'modbus_variant': 'tcp',
+            'device_ip': '10.0.0.2',
+            **fields
+        }
+
+    def save(self, documents, status=200):
+        response = self.client.post('/api/devices/bulk-save/', json.dumps(documents), content_type='application/json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_creates_and_updates_with_a_result_per_device(self):
+        result = self.save([
+            self.document('DEV_2', variables=[{'item_name': 'V1', 'tag_name': 'TAG_1'}]),
+            self.document('DEV_1', id=self.device.id, device_type='BESS'),
+        ])
+        created = Device.objects.get(device_name='DEV_2')
+        self.assertEqual(result['results'], [
+            {'index': 0, 'device_id': created.id, 'device_name': 'DEV_2', 'status': 'created'},
+            {'index': 1, 'device_id': self.device.id, 'device_name': 'DEV_1', 'status': 'updated'},
+        ])
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.device_type, 'BESS')
+        # Children of a new device are written against its new id.
+        self.assertEqual(list(created.variables.values_list('item_name', 'tag_name')), [('V1', 'TAG_1')])
+
+    def test_one_invalid_device_saves_nothing(self):
+        version = DataVersion.current()
+        result = self.save([
+            self.document('DEV_2', variables=[{'item_name': 'V1'}]),
+            self.document('DEV_1', id=self.device.id, device_type='BESS'),
+            self.document('DEV_3', device_type='NOT_A_TYPE'),
+            self.document('DEV_4', tag_prefix=''),
+        ], status=400)
+
+        self.assertEqual([bool(row['errors']) for row in result['results']], [False, False, True, True])
+        self.assertIn('device_type', result['results'][2]['errors'])
+        self.assertEqual(result['results'][3]['errors'], {'tag_prefix': 'tag_prefix is required'})
+        self.assertEqual(list(Device.objects.values_list('device_name', 'device_type')), [('DEV_1', 'PV')])
+        self.assertFalse(Variable.objects.exists())
+        self.assertEqual(DataVersion.current(), version)
+
+    def test_a_failing_write_rolls_back_every_device(self):
+        with mock.patch('webapp.devices.sync_children', side_effect=OperationalError('database is locked')):
+            result = self.save([
+                self.document('DEV_2', variables=[]),
+                self.document('DEV_1', id=self.device.id, device_type='BESS'),
+            ], status=500)
+        self.assertEqual(result['error'], 'database is locked')
+        self.assertEqual(list(Device.objects.values_list('device_name', 'device_type')), [('DEV_1', 'PV')])
+
+    def test_name_clashes_are_rejected(self):
+        result = self.save([self.document('DEV_2'), self.document('DEV_2')], status=400)
+        self.assertEqual([bool(row['errors']) for row in result['results']], [False, True])
+        self.assertIn('device_name', result['results'][1]['errors'])
+
+        result = self.save([self.document('DEV_1')], status=400)
+        self.assertIn('already exists: DEV_1', result['results'][0]['errors']['device_name'])
+        self.assertEqual(Device.objects.count(), 1)
+
+        # A device keeping its own name is not a clash.
+        self.save([self.document('DEV_1', id=self.device.id)])
+
+    def test_child_errors_and_unknown_ids_are_reported(self):
+        result = self.save([
+            self.document('DEV_2', variables=[{'item_name': 'V1'}, {'item_name': 'V1'}]),
+            self.document('DEV_3', alarms='not a list'),
+            self.document('DEV_4', id=999999),
+        ], status=400)
+        errors = [row['errors'] for row in result['results']]
+        self.assertEqual(errors[0], {'variables': 'Duplicate item_name: V1'})
+        self.assertEqual(errors[1], {'alarms': 'Expected a list of alarms objects'})
+        self.assertEqual(errors[2], {'id': 'Device 999999 does not exist'})
+
+
+class ExportCompressionTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(20):
+            device = create_device(f'DEV_{index}')
+            Variable.objects.create(device=device, item_name='V1', **variable_values('TAG_1', equipment=device.device_name))
+
+    def export(self, **headers):
+        response = self.client.get('/api/csv/generate/', {'type': 'variables'}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response) if response.streaming else response.content
+
+    def test_gzip_clients_get_a_gzipped_body_and_weak_etag(self):
+        plain, body = self.export()
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertFalse(plain['ETag'].startswith('W/'))
+
+        gzipped, gzipped_body = self.export(accept_encoding='gzip, deflate')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+        self.assertEqual(gzipped['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(gzip.decompress(gzipped_body), body)
+
+    def test_cached_gzip_body_is_streamed_inflated(self):
+        _, expected = self.export()
+        self.export(accept_encoding='gzip')
+
+        response, body = self.export()
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(body, expected)
+
+    def test_gunzip_chunks_are_bounded(self):
+        content = b'A;B;C\n' * 100000
+        chunks = list(gunzip_chunks(gzip.compress(content), chunk_size=1024))
+        self.assertEqual(b''.join(chunks), content)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), 1024)
+
+    def test_zip_downloads_are_not_compressed_again(self):
+        response = self.client.get('/api/modbus/bundle/', headers={'accept_encoding': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertNotIn('Content-Encoding', response)
+        body = b''.join(response) if response.streaming else response.content
+        self.assertIsNone(zipfile.ZipFile(io.BytesIO(body)).testzip())
+
+    def test_other_responses_are_gzipped_by_the_middleware(self):
+        response = self.client.get('/api/devices/', headers={'accept_encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['devices'][0]['device_name'], 'DEV_19')
+
+
+class ExportFilterTests(WebappTestCase):
+
+    EXPORT_URLS = ['/api/csv/generate/', '/api/iec/xml/', '/api/iec/files/', '/api/modbus/bundle/']
+
+    def setUp(self):
+        super().setUp()
+        self.devices = {}
+        for name, created, fields in [
+            ('PV_1', '2024-01-10', {}),
+            ('BESS_1', '2024-02-10', {'device_type': 'BESS', 'modbus_variant': 'rtu', 'gateway_address': '10.0.0.9'}),
+            ('IED_1', '2024-01-10', {'device_type': 'IED', 'protocol': 'iec', 'modbus_variant': None, 'brcb': 'BR1'}),
+            ('IED_2', '2024-03-10', {'device_type': 'IED', 'protocol': 'iec', 'modbus_variant': None, 'brcb': 'BR2'}),
+        ]:
+            device = create_device(name, **fields)
+            Variable.objects.create(device=device, item_name='V1', **variable_values('TAG_1', equipment=name))
+            Device.objects.filter(id=device.id).update(created_at=timezone.make_aware(datetime.fromisoformat(created)))
+            self.devices[name] = device
+
+    def get(self, url, status=200, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def body(self, response):
+        return b''.join(response) if response.streaming else response.content
+
+    def members(self, response):
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as archive:
+            return {name: archive.read(name).decode() for name in archive.namelist()}
+
+    def exported(self, text):
+        return {name for name in self.devices if name in text}
+
+    def test_invalid_filters_are_rejected(self):
+        for params in [
+            {'ids': '1,x'},
+            {'ids': '-1'},
+            {'protocol': 'snmp'},
+            {'device_type': 'PV,Boiler'},
+            {'modbus_variant': 'ascii'},
+            {'created_after': 'yesterday'},
+            {'created_before': '2024-13-01'},
+            {'updated_after': '2024-01-01T25:00'},
+        ]:
+            for url in self.EXPORT_URLS:
+                with self.subTest(url=url, **params):
+                    response = self.get(url, 400, type='equipment', **params)
+                    self.assertFalse(response.json()['success'])
+                    self.assertNotIn('ETag', response)
+
+        error = self.get('/api/csv/generate/', 400, type='equipment', device_type='PV,Boiler').json()['error']
+        self.assertEqual(error, 'Invalid device_type: Boiler')
+
+    def test_filters_narrow_csv_exports(self):
+        ids = f'{self.devices["PV_1"].id},{self.devices["IED_2"].id}'
+        for params, expected in [
+            ({}, {'PV_1', 'BESS_1', 'IED_1', 'IED_2'}),
+            ({'protocol': 'modbus'}, {'PV_1', 'BESS_1'}),
+            ({'device_type': 'BESS,IED'}, {'BESS_1', 'IED_1', 'IED_2'}),
+            ({'modbus_variant': 'rtu'}, {'BESS_1'}),
+            ({'ids': ids}, {'PV_1', 'IED_2'}),
+            ({'created_after': '2024-02-01', 'created_before': '2024-03-01'}, {'BESS_1'}),
+            ({'created_after': '2024-02-10T00:00:00+00:00'}, {'BESS_1', 'IED_2'}),
+            ({'protocol': 'modbus', 'created_before': '2024-02-01'}, {'PV_1'}),
+        ]:
+            for csv_type in ['equipment', 'variables']:
+                with self.subTest(csv_type=csv_type, **params):
+                    response = self.get('/api/csv/generate/', type=csv_type, **params)
+                    self.assertEqual(self.exported(self.body(response).decode()), expected)
+
+    def test_filtered_exports_get_their_own_etag(self):
+        etags = {
+            self.get('/api/csv/generate/', type='equipment', **params)['ETag']
+            for params in [{}, {'protocol': 'modbus'}, {'protocol': 'iec'}]
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_filters_narrow_iec_exports(self):
+        response = self.get('/api/iec/xml/', created_after='2024-02-01')
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertIn('filename="IED_2.xml"', response['Content-Disposition'])
+
+        response = self.get('/api/iec/xml/', device_type='IED')
+        self.assertEqual(set(self.members(response)), {'IED_1.xml', 'IED_2.xml'})
+
+        members = self.members(self.get('/api/iec/files/', ids=str(self.devices['IED_1'].id)))
+        self.assertEqual(set(members), {'IEC_EQUIP.csv', 'IEC_UNITS.csv', 'IEC_PORTS.csv', 'IED_1.xml'})
+        self.assertEqual(self.exported(members['IEC_EQUIP.csv']), {'IED_1'})
+        self.assertEqual(self.exported(members['IEC_UNITS.csv']), {'IED_1'})
+
+        for url in ['/api/iec/xml/', '/api/iec/files/']:
+            with self.subTest(url):
+                self.assertEqual(self.get(url, 400, protocol='modbus').json()['error'], 'No IEC devices found')
+
+    def test_filters_narrow_the_modbus_bundle(self):
+        for params, expected in [
+            ({}, {'PV_1', 'BESS_1', 'IED_1', 'IED_2'}),
+            ({'device_type': 'BESS'}, {'BESS_1'}),
+            ({'protocol': 'modbus', 'created_after': '2024-01-01', 'created_before': '2024-02-01'}, {'PV_1'}),
+        ]:
+            with self.subTest(**params):
+                members = self.members(self.get('/api/modbus/bundle/', **params))
+                for name in ['EQUIP.csv', 'UNITS.csv', 'VARIABLES.csv']:
+                    self.assertEqual(self.exported(members[name]), expected, name)
+
+
+def buffered_zip(members):
+    # How the IEC downloads were built before they streamed: the whole
+    # archive written into memory with writestr.
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for filename, content in members:
+            zip_file.writestr(filename, content)
+    return buffer.getvalue()
+
+
+def citect_csv(header, rows):
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=',', quoting=csv.QUOTE_ALL)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+class ZipExportTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() - timedelta(days=1)
+        for index in range(2):
+            device = create_device(f'DEV_{index}')
+            Variable.objects.bulk_create(
+                Variable(device=device, item_name=f'V{number}', **variable_values(f'TAG_{number}', equipment=f'DEV_{index}'))
+                for number in range(1500)
+            )
+            Trend.objects.create(device=device, tag_description='Power', trend_types='periodic',
+                                 tag_name='TAG_1', item_name='V1')
+        for index in range(3):
+            create_device(
+                f'IED_{index}', device_type='IED', protocol='iec', modbus_variant=None, io_device=f'IO_IED_{index}',
+                iec_device_ip=f'10.0.1.{index}', iec_port=102 + index, access_point=f'AP{index}',
+                brcb=f'LLN0$BR$brcb{index}', urcb='LLN0$RP$urcbA01' if index else ''
+            )
+        # Distinct creation times, so the old and new device orders agree.
+        for offset, device in enumerate(Device.objects.order_by('id')):
+            Device.objects.filter(id=device.id).update(created_at=start + timedelta(minutes=offset))
+        self.iec_devices = list(Device.objects.filter(protocol='iec').order_by('-created_at'))
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(response.streaming)
+        chunks = list(response)
+        return chunks, b''.join(chunks)
+
+    def assertSameArchive(self, body, expected):
+        with zipfile.ZipFile(io.BytesIO(body)) as archive, zipfile.ZipFile(io.BytesIO(expected)) as reference:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), reference.namelist())
+            for name in reference.namelist():
+                with self.subTest(name):
+                    self.assertEqual(archive.read(name), reference.read(name))
+                    self.assertEqual(archive.getinfo(name).compress_type, zipfile.ZIP_DEFLATED)
+
+    def xml_members(self):
+        return [
+            (f'{device.device_name}.xml', baseline_iec_document({
+                'device_name': device.device_name, 'ied_name': device.ied_name or '',
+                'logical_device': device.logical_device or '', 'scl_file': device.scl_file or '',
+                'brcb': device.brcb or '', 'urcb': device.urcb or ''
+            }))
+            for device in self.iec_devices
+        ]
+
+    def test_iec_xml_zip_matches_the_buffered_archive(self):
+        _, body = self.download('/api/iec/xml/')
+        self.assertSameArchive(body, buffered_zip(self.xml_members()))
+
+    def test_iec_files_zip_matches_the_buffered_archive(self):
+        devices = self.iec_devices
+        expected = buffered_zip([
+            ('IEC_EQUIP.csv', citect_csv(
+                ['Name', 'Cluster Name', 'Type', 'Tag Prefix', 'I/O Device'],
+                [[device.device_name, 'c1', device.device_type, device.tag_prefix, device.io_device] for device in devices]
+            )),
+            ('IEC_UNITS.csv', citect_csv(
+                ['Server Name', 'Name', 'Number', 'Address', 'Protocol', 'Port Name', 'Startup Mode', 'Priority', 'Memory'],
+                [['c1', device.io_device, str(100 + index), device.iec_device_ip, f'IEC{device.iec_port}',
+                  device.access_point, 'Primary', '1', 'TRUE'] for index, device in enumerate(devices)]
+            )),
+            ('IEC_PORTS.csv', citect_csv(
+                ['Server Name', 'Port Name', 'Port Number', 'Board Name'],
+                [['IOServer1', device.access_point, device.iec_port, device.board_name or ''] for device in devices]
+            )),
+            *self.xml_members(),
+        ])
+        _, body = self.download('/api/iec/files/')
+        self.assertSameArchive(body, expected)
+
+    def test_modbus_bundle_holds_the_csv_downloads(self):
+        expected = []
+        for csv_type, filename in [('equipment', 'EQUIP.csv'), ('units', 'UNITS.csv'), ('variables', 'VARIABLES.csv'),
+                                   ('alarms', 'ALARMS.csv'), ('trends', 'TRENDS.csv')]:
+            response = self.client.get('/api/csv/generate/', {'type': csv_type})
+            expected.append((filename, b''.join(response)))
+        self.assertEqual(expected[2][1].count(b'\n'), 3001)
+
+        chunks, body = self.download('/api/modbus/bundle/')
+        self.assertGreater(len(chunks), len(expected))
+        self.assertSameArchive(body, buffered_zip(expected))
+
+    def test_cached_archive_is_unchanged(self):
+        _, body = self.download('/api/modbus/bundle/')
+        response = self.client.get('/api/modbus/bundle/')
+        cached = b''.join(response) if response.streaming else response.content
+        self.assertEqual(cached, body)
+
+
+class SearchTests(WebappTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = create_device('DEV_1')
+        self.tag_match = Variable.objects.create(
+            device=self.device, item_name='SPEED_1', **variable_values('LLN0\\Pump\\spd', equipment='DEV_1')
+        )
+        self.name_match = Variable.objects.create(
+            device=self.device, item_name='Pump_speed', **variable_values('LLN0\\Fan\\spd', equipment='DEV_1')
+        )
+        self.detail_match = Trend.objects.create(
+            device=self.device, tag_description='Speed_2', tag_name='LLN0\\Fan\\hz', item_name='Pump_item'
+        )
+
+    def search(self, status=200, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def found(self, **params):
+        return [(row['kind'], row['id']) for row in self.search(**params)['results']]
+
+    def test_tag_matches_rank_above_name_and_detail_matches(self):
+        self.assertEqual(self.found(q='pump'), [
+            ('variable', self.tag_match.id), ('variable', self.name_match.id), ('trend', self.detail_match.id)
+        ])
+        self.assertEqual(self.found(q='pump', kind='trend'), [('trend', self.detail_match.id)])
+        # Every term has to match.
+        self.assertCountEqual(self.found(q='pump fan'), [('variable', self.name_match.id), ('trend', self.detail_match.id)])
+
+    def test_pages(self):
+        Alarm.objects.bulk_create([
+            Alarm(device=self.device, alarm_name=f'ALARM_{index}', alarm_tag=f'Pump_trip_{index}') for index in range(5)
+        ])
+        found = []
+        for page in range(1, 4):
+            result = self.search(q='pump', page=page, page_size=3)
+            found += result['results']
+            self.assertEqual(result['next_page'], page + 1 if page < 3 else None)
+        self.assertEqual(len({(row['kind'], row['id']) for row in found}), 8)
+        self.assertEqual(found[0]['device_name'], 'DEV_1')
+
+    def test_invalid_queries_are_rejected(self):
+        for params in [{}, {'q': 'pu'}, {'q': 'pump sp'}]:
+            self.assertEqual(self.search(status=400, **params)['error'], 'Search terms need at least 3 characters')
+        self.assertEqual(self.search(status=400, q='pump', kind='device')['error'], 'Invalid kind: device')
+        self.assertEqual(self.search(status=400, q='pump', page_size='x')['error'], 'Invalid page or page_size')
+
+    def test_matches_are_literal(self):
+        self.assertEqual(self.found(q='Pump\\spd'), [('variable', self.tag_match.id)])
+        self.assertEqual(self.found(q='"pump'), [])
+        self.assertEqual(self.found(q='%um'), [])
+
+
+class IndexedSearchTests(SearchTests):
+
+    def test_triggers_follow_updates_and_deletes(self):
+        # Queryset writes send no signals; the triggers still run.
+        Variable.objects.filter(pk=self.tag_match.pk).update(tag_name='LLN0\\Valve\\pos')
+        self.assertEqual(indexed('Valve'), {search_rowid('variable', self.tag_match)})
+        self.assertNotIn(search_rowid('variable', self.tag_match), indexed('Pump'))
+
+        raw_delete(Trend.objects.all())
+        self.assertEqual(indexed('Pump'), {search_rowid('variable', self.name_match)})
+
+        alarm = Alarm.objects.create(device=self.device, alarm_name='ALARM_1', alarm_tag='Valve_trip')
+        self.assertEqual(indexed('Valve'), {search_rowid('variable', self.tag_match), search_rowid('alarm', alarm)})
+
+
+    def test_index_needs_trigram_fts5(self):
+        migration = importlib.import_module('webapp.migrations.0009_tag_search')
+        self.assertTrue(migration.trigram_fts5_available(connection))
+
+        old_sqlite = mock.Mock(vendor='sqlite', Database=mock.Mock(sqlite_version_info=(3, 31, 1)))
+        self.assertFalse(migration.trigram_fts5_available(old_sqlite))
+        self.assertFalse(migration.trigram_fts5_available(mock.Mock(vendor='postgresql')))
+
+
+class LikeSearchTests(SearchTests):
+    """The same searches without the FTS5 index, as on databases that cannot build it."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('webapp.search.search_index_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_admin_search_uses_like(self):
+        model_admin = admin.site._registry[Variable]
+        queryset, _ = model_admin.get_search_results(None, Variable.objects.all(), 'pump fan')
+        self.assertEqual(list(queryset), [self.name_match])
+
+
+def baseline_iec_document(values):
+    # The f-string generate_iec_xml_only rendered before the shared renderer.
+    device_name = values['device_name']
+    scl_file = values['scl_file'] or f'[USER]:{device_name}_Project\\{device_name}.cid'
+    xml_content = f'''<?xml version="1.0" encoding="utf-8"?>
+<ScadaDevice xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns="http://www.schneider-electric.com/SCADA/Drivers/IEC61850/DeviceConfig/v1/">
+  <SCL>{scl_file}</SCL>
+  <IED>{values['ied_name'] or device_name}</IED>
+  <LogicalDevice Name="{values['logical_device'] or 'Relay'}">'''
+    if values['urcb']:
+        xml_content += f'\n    <URCB>{values["urcb"]}</URCB>'
+    if values['brcb']:
+        xml_content += f'\n    <BRCB>{values["brcb"]}</BRCB>'
+    return xml_content + '\n  </LogicalDevice>\n</ScadaDevice>'
+
+
+class IecDocumentTests(WebappTestCase):
+
+    NAMESPACE = '{http://www.schneider-electric.com/SCADA/Drivers/IEC61850/DeviceConfig/v1/}'
+
+    def values(self, **fields):
+        return {'device_name': 'IED_1', 'ied_name': '', 'logical_device': '', 'scl_file': '', 'brcb': '', 'urcb': '',
+                **fields}
+
+    def test_valid_input_renders_byte_identical_to_the_old_output(self):
+        for values in [
+            self.values(),
+            self.values(ied_name='RELAY_7', logical_device='LD0', scl_file='C:\\Projects\\relay.cid'),
+            self.values(brcb='LLN0$BR$brcbA01'),
+            self.values(urcb='LLN0$RP$urcbA01', brcb='LLN0$BR$brcbA01'),
+        ]:
+            with self.subTest(values):
+                self.assertEqual(render_document(values).encode(), baseline_iec_document(values).encode())
+
+    def test_special_characters_are_escaped(self):
+        values = self.values(
+            ied_name='A&B <1>', logical_device='LD "0" & <x>', scl_file='C:\\R&D\\<relay>.cid',
+            urcb='URCB<&>', brcb='BRCB"&"'
+        )
+        document = render_document(values)
+        root = ET.fromstring(document.encode())
+        self.assertEqual(root.find(f'{self.NAMESPACE}SCL').text, values['scl_file'])
+        self.assertEqual(root.find(f'{self.NAMESPACE}IED').text, values['ied_name'])
+        logical_device = root.find(f'{self.NAMESPACE}LogicalDevice')
+        self.assertEqual(logical_device.get('Name'), values['logical_device'])
+        self.assertEqual(logical_device.find(f'{self.NAMESPACE}URCB').text, values['urcb'])
+        self.assertEqual(logical_device.find(f'{self.NAMESPACE}BRCB').text, values['brcb'])
+        self.assertIn('<IED>A&amp;B &lt;1&gt;</IED>', document)
@@ -13,6 +13,11 @@ urlpatterns = [
 
 
     path('api/devices/', views.get_devices, name='get_devices'),
+    path('api/devices/count/', views.get_device_count, name='get_device_count'),
+    path('api/devices/batch/', views.get_devices_batch, name='get_devices_batch'),
+    path('api/devices/bulk-save/', views.bulk_save_devices, name='bulk_save_devices'),
+    path('api/devices/bulk-delete/', views.bulk_delete_devices, name='bulk_delete_devices'),
+    path('api/search/', views.search_tags, name='search_tags'),
     path('api/device/save/', views.save_device, name='save_device'),
     path('api/device/<int:device_id>/', views.get_device, name='get_device'),
     path('api/device/<int:device_id>/delete/', views.delete_device, name='delete_device'),
@@ -20,10 +25,17 @@ urlpatterns = [
 
     path('api/csv/generate/', views.generate_csv, name='generate_csv'),
     path('api/csv/upload/', views.upload_csv, name='upload_csv'),
+    path('api/bundle/upload/', views.upload_bundle, name='upload_bundle'),
+    path('api/alarms/preview/<int:import_id>/', views.get_alarm_preview, name='get_alarm_preview'),
 
 
     path('api/cid/upload/', views.upload_cid, name='upload_cid'),
 
 
+    path('api/jobs/<int:job_id>/', views.get_import_job, name='get_import_job'),
+
+
     path('api/iec/xml/', views.generate_iec_xml_only, name='generate_iec_xml_only'),
+    path('api/iec/files/', views.generate_all_iec_files, name='generate_all_iec_files'),
+    path('api/modbus/bundle/', views.generate_modbus_bundle, name='generate_modbus_bundle'),
 ]
\ No newline at end of file